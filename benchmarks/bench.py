@@ -0,0 +1,152 @@
+"""
+Benchmark de las etapas del pipeline sobre solicitudes sintéticas.
+
+Uso:
+    python benchmarks/bench.py --paginas 300 --secciones 40 --imagenes 2 --keywords 200 --salida resultados.json
+
+Mide tiempo (mediana de las repeticiones) y pico de memoria (tracemalloc) de `load_document`,
+`extract_index_titles`, `identify_sections`, `export_all_sections` y `process_files`, y escribe
+un JSON que se puede comparar entre commits.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generar import generar_solicitud, generar_configuracion, generar_keywords  # noqa: E402
+from procesar import DocumentProcessor  # noqa: E402
+from exportar import DocumentExporter  # noqa: E402
+from insertar import ContentInserter  # noqa: E402
+
+ETAPAS = ("load_document", "extract_index_titles", "identify_sections", "export_all_sections", "process_files")
+
+
+def _medir(funcion, memoria):
+    """Ejecuta `funcion` y devuelve (resultado, segundos, pico de memoria en bytes o None)."""
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    pico = None
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def ejecutar_una_vez(solicitud, keywords, mapeo, config_dir, trabajo_dir, streaming, memoria):
+    """Ejecuta el pipeline completo una vez y devuelve las medidas por etapa."""
+    medidas = {}
+    processor = DocumentProcessor(solicitud, streaming=streaming)
+
+    _, medidas["load_document"], pico_carga = _medir(processor.load_document, memoria)
+    medidas["load_document_memoria"] = pico_carga
+
+    titulos, medidas["extract_index_titles"], pico = _medir(lambda: processor.extract_index_titles(keywords), memoria)
+    medidas["extract_index_titles_memoria"] = pico
+
+    # identify_sections vuelve a extraer el índice, como en el flujo real
+    _, medidas["identify_sections"], pico = _medir(lambda: processor.identify_sections(keywords), memoria)
+    medidas["identify_sections_memoria"] = pico
+    sections = processor.get_sections()
+
+    salida = os.path.join(trabajo_dir, "secciones")
+    exporter = DocumentExporter(sections, salida)
+    _, medidas["export_all_sections"], pico = _medir(lambda: exporter.export_all_sections(export_format="docx"), memoria)
+    medidas["export_all_sections_memoria"] = pico
+
+    inserter = ContentInserter(input_dir=salida, config_dir=config_dir, exporter=exporter,
+                               output_dir=os.path.join(trabajo_dir, "plantillas"))
+    os.makedirs(os.path.join(trabajo_dir, "plantillas"), exist_ok=True)
+    _, medidas["process_files"], pico = _medir(lambda: inserter.process_files(mapping_file=mapeo, proyecto_menor=False), memoria)
+    medidas["process_files_memoria"] = pico
+
+    medidas["titulos_indice"] = len(titulos)
+    medidas["secciones"] = len(sections)
+    return medidas
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, default=50)
+    parser.add_argument("--secciones", type=int, default=40, help="Títulos ARTICA del documento.")
+    parser.add_argument("--entradas-toc", type=int, default=None, help="Entradas del índice que coinciden con keywords (por defecto todas).")
+    parser.add_argument("--imagenes", type=int, default=1, help="Imágenes por sección (la primera es un logo repetido).")
+    parser.add_argument("--keywords", type=int, default=50, help="Número total de keywords.")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--streaming", action="store_true", help="Usar el lector en streaming.")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir memoria (tracemalloc ralentiza las etapas).")
+    parser.add_argument("--salida", default=os.path.join(BASE_DIR, "benchmarks", "resultados.json"))
+    args = parser.parse_args(argv)
+
+    entradas_toc = args.secciones if args.entradas_toc is None else min(args.entradas_toc, args.secciones)
+
+    with tempfile.TemporaryDirectory(prefix="bench_ing_") as tmp:
+        solicitud = os.path.join(tmp, "solicitud.docx")
+        titulos = generar_solicitud(solicitud, paginas=args.paginas, secciones=args.secciones, imagenes_por_seccion=args.imagenes)
+        config_dir = os.path.join(tmp, "config")
+        mapeo = generar_configuracion(config_dir, titulos)
+        keywords = generar_keywords(titulos, entradas_toc, args.keywords)
+
+        repeticiones = []
+        for numero in range(args.repeticiones):
+            trabajo_dir = os.path.join(tmp, f"ejecucion_{numero}")
+            repeticiones.append(ejecutar_una_vez(solicitud, keywords, mapeo, config_dir, trabajo_dir,
+                                                 args.streaming, not args.sin_memoria))
+        tamano = os.path.getsize(solicitud)
+
+    etapas = {}
+    for etapa in ETAPAS:
+        tiempos = [r[etapa] for r in repeticiones]
+        picos = [r[f"{etapa}_memoria"] for r in repeticiones if r[f"{etapa}_memoria"] is not None]
+        etapas[etapa] = {
+            "segundos_mediana": statistics.median(tiempos),
+            "segundos_min": min(tiempos),
+            "pico_memoria_mb": round(max(picos) / 2**20, 2) if picos else None,
+        }
+
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "parametros": {
+            "paginas": args.paginas, "secciones": args.secciones, "entradas_toc": entradas_toc,
+            "imagenes_por_seccion": args.imagenes, "keywords": args.keywords,
+            "repeticiones": args.repeticiones, "streaming": args.streaming, "tamano_documento": tamano,
+        },
+        "titulos_indice": repeticiones[-1]["titulos_indice"],
+        "secciones_encontradas": repeticiones[-1]["secciones"],
+        "etapas": etapas,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+    with open(args.salida, "w", encoding="utf-8") as file:
+        json.dump(resultado, file, ensure_ascii=False, indent=2)
+
+    for etapa, medida in etapas.items():
+        print(f"{etapa:22s} {medida['segundos_mediana']:8.3f}s  {medida['pico_memoria_mb'] or '-':>8} MB")
+    print(f"Resultados guardados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Generador de solicitudes sintéticas, mapeo y plantillas para los benchmarks."""
+import io
+import os
+import struct
+import zlib
+import random
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_BREAK
+from openpyxl import Workbook
+
+PARRAFOS_POR_PAGINA = 8
+SECCIONES_POR_PLANTILLA = 10
+
+
+def _png(color, lado=64):
+    """PNG RGB de un solo color, generado sin dependencias externas."""
+    fila = b"\x00" + bytes(color) * lado
+    crudo = fila * lado
+
+    def chunk(tipo, datos):
+        return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos) & 0xFFFFFFFF)
+
+    cabecera = struct.pack(">IIBBBBB", lado, lado, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", cabecera) + chunk(b"IDAT", zlib.compress(crudo)) + chunk(b"IEND", b"")
+
+
+def _estilos(doc, nombres):
+    for nombre in nombres:
+        if nombre not in doc.styles:
+            doc.styles.add_style(nombre, WD_STYLE_TYPE.PARAGRAPH)
+
+
+def titulos_secciones(secciones):
+    return [f"Instalación de la partida {i:04d}" for i in range(secciones)]
+
+
+def generar_keywords(titulos, entradas_toc, total_keywords):
+    """Keywords que encuentran `entradas_toc` títulos, completadas con keywords sin coincidencia."""
+    keywords = [titulo.split(" de la ")[-1] for titulo in titulos[:entradas_toc]]
+    keywords += [f"Capítulo inexistente {j:05d}" for j in range(max(0, total_keywords - len(keywords)))]
+    return keywords
+
+
+def generar_solicitud(ruta, paginas=50, secciones=40, imagenes_por_seccion=1, semilla=0):
+    """
+    Genera un .docx con índice ("TOC 1"), `secciones` títulos ARTICA y texto de relleno
+    hasta ocupar aproximadamente `paginas` páginas. Devuelve la lista de títulos.
+    El índice lista todas las secciones; cuántas entradas coinciden lo fija `generar_keywords`.
+    """
+    rnd = random.Random(semilla)
+    doc = Document()
+    _estilos(doc, ["TOC 1", "ARTICA 1", "ARTICA 2"])
+    titulos = titulos_secciones(secciones)
+
+    # Índice
+    for numero, titulo in enumerate(titulos, start=1):
+        doc.add_paragraph(f"{numero}. {titulo}\t{numero + 2}", style="TOC 1")
+    doc.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+
+    # Un logo repetido en todas las secciones y una imagen distinta por sección
+    logo = _png((200, 30, 30))
+    total_parrafos = max(paginas * PARRAFOS_POR_PAGINA, secciones * 4)
+    por_seccion = max(2, total_parrafos // max(1, secciones))
+
+    for numero, titulo in enumerate(titulos):
+        doc.add_paragraph(titulo, style="ARTICA 1")
+        for i in range(por_seccion):
+            parrafo = doc.add_paragraph()
+            negrita = parrafo.add_run(f"Partida {numero}.{i}: ")
+            negrita.bold = True
+            parrafo.add_run(" ".join(rnd.choice(("hormigón", "acero", "tubería", "cuadro", "válvula", "zanja")) for _ in range(30)))
+            if i == por_seccion // 2:
+                doc.add_paragraph(f"{titulo} - apartado {i}", style="ARTICA 2")
+        for i in range(imagenes_por_seccion):
+            imagen = logo if i == 0 else _png((numero % 256, i % 256, 90))
+            doc.add_paragraph().add_run().add_picture(io.BytesIO(imagen))
+
+    doc.save(ruta)
+    return titulos
+
+
+def generar_configuracion(config_dir, titulos):
+    """
+    Crea plantillas de memoria y presentación (como las de config/) con un título ARTICA por
+    sección y el Excel de mapeo correspondiente. Devuelve la ruta del mapeo.
+    """
+    os.makedirs(os.path.join(config_dir, "memorias"), exist_ok=True)
+    os.makedirs(os.path.join(config_dir, "presentaciones"), exist_ok=True)
+
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(["proyecto", "seccion", "keyword", "ruta", "presentacion", "memoria", "contrato"])
+
+    for inicio in range(0, len(titulos), SECCIONES_POR_PLANTILLA):
+        grupo = titulos[inicio:inicio + SECCIONES_POR_PLANTILLA]
+        numero = inicio // SECCIONES_POR_PLANTILLA
+        memoria = f"XXX-BENCH{numero:03d}-3. Anexo I-Memoria_TIPO.docx"
+        presentacion = f"XXX-BENCH{numero:03d}-1. Presentación_TIPO.docx"
+
+        for carpeta, nombre, estilo in (("memorias", memoria, "ARTICA 3"), ("presentaciones", presentacion, "ARTICA 7")):
+            plantilla = Document()
+            _estilos(plantilla, [estilo])
+            plantilla.add_paragraph("PLANTILLA DE BENCHMARK")
+            for titulo in grupo:
+                plantilla.add_paragraph(f"5.- {titulo.upper()}", style=estilo)
+                plantilla.add_paragraph("Texto de la plantilla.")
+            plantilla.save(os.path.join(config_dir, carpeta, nombre))
+
+        for titulo in grupo:
+            hoja.append(["BENCH", titulo.upper(), titulo, f"cliente\\BENCH\\{numero:03d}", presentacion, memoria, None])
+
+    ruta_mapeo = os.path.join(config_dir, "mapeo ingenieria.xlsx")
+    libro.save(ruta_mapeo)
+    return ruta_mapeo
@@ -0,0 +1,77 @@
+"""
+Comprueba el tiempo de importación del punto de entrada con `python -X importtime`.
+
+Uso:
+    python benchmarks/importtime.py --presupuesto 300 --salida importtime.json
+
+Importa `RUN` (y con él todo el grafo de módulos de `src/`) en un intérprete nuevo, suma el
+tiempo acumulado de los módulos de primer nivel y falla (código de salida 1) si supera el
+presupuesto en milisegundos o si se cargan módulos pesados que el arranque no necesita.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BASE_DIR, "src")
+
+# Módulos que no deben cargarse al arrancar: o no se usan o solo hacen falta en casos concretos
+PROHIBIDOS = ("pandas", "numpy", "PIL", "openpyxl", "http.server")
+
+# import time: self [us] | cumulative | imported package
+_LINEA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+
+def medir_importacion(modulo="RUN"):
+    """Importa `modulo` en un proceso nuevo y devuelve (milisegundos, {módulo: ms acumulados})."""
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    modulos = {}
+    for linea in proceso.stderr.splitlines():
+        match = _LINEA.match(linea)
+        if not match:
+            continue
+        acumulado, sangria, nombre = int(match.group(2)), match.group(3), match.group(4)
+        modulos[nombre] = acumulado / 1000
+        if len(sangria) == 1:  # Módulos de primer nivel: su acumulado ya incluye el de los que importan
+            total += acumulado
+    return total / 1000, modulos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modulo", default="RUN")
+    parser.add_argument("--presupuesto", type=float, default=300.0, help="Máximo de milisegundos de importación (mediana).")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Módulos más costosos que se muestran.")
+    parser.add_argument("--salida", default=None, help="JSON opcional con el resultado.")
+    args = parser.parse_args(argv)
+
+    medidas = [medir_importacion(args.modulo) for _ in range(args.repeticiones)]
+    mediana = statistics.median(total for total, _ in medidas)
+    modulos = medidas[-1][1]
+    prohibidos = [nombre for nombre in PROHIBIDOS if nombre in modulos]
+
+    for nombre, ms in sorted(modulos.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{nombre:40s} {ms:8.1f} ms")
+    print(f"Importación de {args.modulo}: {mediana:.1f} ms (presupuesto {args.presupuesto:.0f} ms)")
+    if prohibidos:
+        print(f"Módulos pesados cargados al arrancar: {', '.join(prohibidos)}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as file:
+            json.dump({"modulo": args.modulo, "milisegundos_mediana": mediana, "presupuesto": args.presupuesto,
+                       "prohibidos": prohibidos, "modulos": modulos}, file, ensure_ascii=False, indent=2)
+
+    return 1 if mediana > args.presupuesto or prohibidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
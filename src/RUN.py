@@ -1,79 +1,234 @@
 import os
+import sys
+import json
+import time
+import signal
 import logging
+import argparse
+from datetime import datetime
 from decouple import config
 from logging_config import setup_logging
-from procesar import DocumentProcessor
-from exportar import DocumentExporter
 from organizar import DocumentOrganizer
-from insertar import ContentInserter
+from manifiesto import cargar_manifiesto
+from indice import load_keywords
+from lote import procesar_lote
+from exportar import EXPORT_FORMAT, EXPORT_FORMATS, DOCX_COMPRESSLEVEL
+from cache import ProcessingCache
+from plantillas import precargar_plantillas
+from vigilancia import CarpetaVigilada, es_documento_entrada
+from metricas import combinar, escribir_prometheus
 
-# Configuración del logging
-log_file_path = setup_logging()
 logger = logging.getLogger(__name__)
 
-try:
-    # Rutas desde el archivo .env o configuración de Docker Compose
-    input_dir = config("INPUT_FOLDER")
-    output_dir = config("OUTPUT_FOLDER")
-    map_file_path = config("MAP_FILE")
-    keywords_file_path = config("KEYWORDS_FILE")
+# Códigos de salida
+EXIT_OK = 0
+EXIT_ERRORES = 1  # Alguna solicitud no se pudo procesar
+EXIT_CONFIGURACION = 2  # Error de configuración, manifiesto o argumentos
 
-    logger.info("Configuración y rutas cargadas correctamente.")
-except Exception as e:
-    logger.exception(f"Error al leer las variables de entorno: {e}")
-    raise
 
+def parse_args(argv=None):
+    """Argumentos de línea de comandos para la ejecución desatendida."""
+    parser = argparse.ArgumentParser(description="Extrae secciones de solicitudes Word y las inserta en las plantillas.")
+    parser.add_argument("--manifiesto", default=config("MANIFEST_FILE", default=""),
+                        help="Manifiesto JSON/YAML con las solicitudes a procesar (sin preguntas interactivas).")
+    parser.add_argument("--cliente", help="Ruta a la carpeta del cliente.")
+    parser.add_argument("--proyecto-menor", choices=("s", "n"),
+                        help="Aplica a todos los archivos de la carpeta de entrada si no se usa manifiesto.")
+    parser.add_argument("--workers", type=int, help="Número de procesos para el lote.")
+    parser.add_argument("--sin-cache", action="store_true",
+                        help="Vuelve a procesar todas las entradas aunque no hayan cambiado desde la última ejecución.")
+    parser.add_argument("--resumen", help="Ruta del informe JSON de la ejecución (por defecto en OUTPUT_FOLDER).")
+    parser.add_argument("--servicio", action="store_true", default=config("SERVICE_MODE", default=False, cast=bool),
+                        help="Arranca el servicio HTTP residente en lugar de procesar un lote.")
+    parser.add_argument("--vigilar", action="store_true", default=config("WATCH_MODE", default=False, cast=bool),
+                        help="Vigila INPUT_FOLDER y procesa los .docx nuevos o modificados a medida que llegan.")
+    return parser.parse_args(argv)
 
-def load_keywords(file_path):
-    """Carga las palabras clave desde un archivo."""
-    logger.debug(f"Intentando abrir el archivo: {file_path}")
+
+def _preguntar(mensaje):
+    """Pregunta al usuario solo si hay un terminal; en ejecución desatendida es un error."""
+    if not sys.stdin.isatty():
+        raise ValueError(f"Falta un dato y no hay terminal interactivo: {mensaje.strip()} Use --manifiesto o los argumentos equivalentes.")
+    return input(mensaje).strip()
+
+
+def escribir_resumen(resultados, ruta, duracion=0.0, ruta_prometheus=None):
+    """
+    Escribe el informe JSON de la ejecución (con las métricas por documento y las totales) y lo
+    registra en el log; con `ruta_prometheus` escribe también las métricas para node_exporter.
+    """
+    resumen = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "duracion": round(duracion, 3),
+        "total": len(resultados),
+        "correctos": sum(1 for r in resultados if r["estado"] in ("ok", "cache")),
+        "sin_cambios": sum(1 for r in resultados if r["estado"] == "cache"),
+        "errores": sum(1 for r in resultados if r["estado"] == "error"),
+        "metricas": combinar(*(r.get("metricas") for r in resultados)),
+        "archivos": resultados,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as file:
+        json.dump(resumen, file, ensure_ascii=False, indent=2)
+
+    if ruta_prometheus:
+        try:
+            escribir_prometheus(resumen, ruta_prometheus)
+        except OSError as e:
+            logger.exception(f"Error al escribir las métricas de Prometheus en {ruta_prometheus}: {e}")
+
+    logger.info(f"Resumen: {resumen['correctos']}/{resumen['total']} solicitudes procesadas, {resumen['errores']} con errores. Informe: {ruta}")
+    return resumen
+
+
+def vigilar(args, input_dir, output_dir, map_file_path, keywords_file_path, workers, export_sections, streaming,
+            cache, log_file_path, metrics_textfile):
+    """Procesa como lotes los documentos que van llegando a `input_dir` hasta Ctrl+C o SIGTERM."""
+    proyecto_menor = args.proyecto_menor == 's'
+    carpeta = CarpetaVigilada(input_dir, espera=config("WATCH_DEBOUNCE", default=2.0, cast=float),
+                              intervalo=config("WATCH_POLL_INTERVAL", default=5.0, cast=float))
+    signal.signal(signal.SIGTERM, lambda *_: carpeta.detener())
+
+    try:
+        # Sin caché no se sabe qué entradas ya se procesaron: solo se atienden las que lleguen
+        for rutas in carpeta.lotes(incluir_existentes=cache is not None):
+            inicio = time.perf_counter()
+            keywords = load_keywords(keywords_file_path)
+            if not keywords:
+                logger.error("No se pudieron cargar las keywords; se omite el lote.")
+                continue
+            logger.info("Nuevos documentos en %s: %d", input_dir, len(rutas))
+            resultados = procesar_lote([(ruta, proyecto_menor) for ruta in rutas], keywords, output_dir, map_file_path,
+                                       workers=workers, log_file_path=log_file_path, export_sections=export_sections,
+                                       streaming=streaming, cache=cache)
+            ruta_resumen = os.path.join(output_dir, f"resumen_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            escribir_resumen(resultados, ruta_resumen, duracion=time.perf_counter() - inicio,
+                             ruta_prometheus=metrics_textfile)
+    except KeyboardInterrupt:
+        pass
+    logger.info("Vigilancia de %s detenida.", input_dir)
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    inicio = time.perf_counter()
+
+    # Configuración del logging
+    log_file_path = setup_logging()
+
+    try:
+        # Rutas desde el archivo .env o configuración de Docker Compose
+        input_dir = config("INPUT_FOLDER")
+        output_dir = config("OUTPUT_FOLDER")
+        map_file_path = config("MAP_FILE")
+        keywords_file_path = config("KEYWORDS_FILE")
+        workers = config("WORKERS", default=1, cast=int)
+        export_sections = config("EXPORT_SECTIONS", default=True, cast=bool)
+        streaming = config("STREAMING_READER", default=False, cast=bool)
+        use_cache = config("CACHE_ENABLED", default=True, cast=bool)
+        metrics_textfile = config("METRICS_TEXTFILE", default="")
+        if EXPORT_FORMAT not in EXPORT_FORMATS:
+            raise ValueError(f"EXPORT_FORMAT debe ser uno de {', '.join(EXPORT_FORMATS)}: '{EXPORT_FORMAT}'")
+        if not 0 <= DOCX_COMPRESSLEVEL <= 9:
+            raise ValueError(f"DOCX_COMPRESSLEVEL debe estar entre 0 y 9: {DOCX_COMPRESSLEVEL}")
+
+        logger.info("Configuración y rutas cargadas correctamente.")
+    except Exception as e:
+        logger.exception(f"Error al leer las variables de entorno: {e}")
+        return EXIT_CONFIGURACION
+
+    if args.servicio:
+        # El servidor HTTP solo se importa en modo servicio
+        from servicio import SolicitudService, ejecutar_servicio
+
+        servicio = SolicitudService(input_dir, output_dir, map_file_path, keywords_file_path,
+                                    workers=args.workers or workers,
+                                    max_pendientes=config("SERVICE_QUEUE_SIZE", default=16, cast=int),
+                                    export_sections=export_sections, streaming=streaming, log_file_path=log_file_path)
+        try:
+            ejecutar_servicio(servicio, host=config("SERVICE_HOST", default="0.0.0.0"),
+                              port=config("SERVICE_PORT", default=5000, cast=int))
+        except (OSError, ValueError) as e:
+            logger.exception(f"No se pudo iniciar el servicio: {e}")
+            return EXIT_CONFIGURACION
+        return EXIT_OK
+
+    if args.vigilar:
+        precargar_plantillas("config")
+        cache = ProcessingCache(output_dir) if use_cache and not args.sin_cache else None
+        try:
+            return vigilar(args, input_dir, output_dir, map_file_path, keywords_file_path, args.workers or workers,
+                           export_sections, streaming, cache, log_file_path, metrics_textfile)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    # Preparar la cola de solicitudes
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            logger.debug(f"Archivo abierto exitosamente: {file_path}")
-            keywords = [line.strip() for line in file if line.strip()]
-            logger.info(f"Keywords cargadas: {keywords}")
-            return keywords
+        if args.manifiesto:
+            manifiesto = cargar_manifiesto(args.manifiesto, input_dir)
+            cliente_name = args.cliente or manifiesto["cliente"]
+            workers = manifiesto["workers"] or workers
+            entradas = manifiesto["entradas"]
+        else:
+            cliente_name = args.cliente or _preguntar("Ingrese la ruta a la carpeta del cliente: ")
+            entradas = []
+            for filename in sorted(os.listdir(input_dir)):
+                if not es_documento_entrada(filename):
+                    continue
+                file_path = os.path.join(input_dir, filename)
+                if args.proyecto_menor:
+                    proyecto_menor = args.proyecto_menor == 's'
+                else:
+                    proyecto_menor = _preguntar(f"¿Es un proyecto menor '{filename}'? (s/n): ").lower() == 's'
+                entradas.append((file_path, proyecto_menor))
+
+        if args.workers:
+            workers = args.workers
+
+        logger.info(f"Nombre de cliente introducido: {cliente_name}")
+        if not cliente_name:
+            raise ValueError("El nombre del cliente no puede estar vacío.")
+
+        # Cargar las keywords
+        keywords = load_keywords(keywords_file_path)
+        if not keywords:
+            raise ValueError("No se pudieron cargar las keywords.")
     except Exception as e:
-        logger.exception(f"Error al cargar las keywords desde {file_path}: {e}")
-        return []
-
-# Flujo principal
-try:
-    # Pedir al usuario el nombre del cliente
-    cliente_name = input("Ingrese la ruta a la carpeta del cliente: ").strip()
-    logger.info(f"Nombre de cliente introducido: {cliente_name}")
-    if not cliente_name:
-        raise ValueError("El nombre del cliente no puede estar vacío.")
-
-    # Cargar las keywords
-    keywords = load_keywords(keywords_file_path)
-    if not keywords:
-        logger.error("No se pudieron cargar las keywords. Finalizando.")
-        exit()
-
-    # Procesar documentos
-    for filename in os.listdir(input_dir):
-        file_path = os.path.join(input_dir, filename)
-        processor = DocumentProcessor(file_path)
-        processor.load_document()
-        processor.identify_sections(keywords)
-
-        sections = processor.get_sections()
-        if sections:
-            exporter = DocumentExporter(sections, output_dir)
-            exporter.export_all_sections(export_format="docx")
-        
-        inserter = ContentInserter(input_dir=output_dir, config_dir="config", exporter=exporter)
-        proyecto_menor = input("¿Es un proyecto menor? (s/n): ").strip().lower() == 's'
-        inserter.process_files(mapping_file=map_file_path, proyecto_menor=proyecto_menor)
-
-    logger.info("Procesamiento y exportación completados exitosamente.")
-
-    # Organizar documentos
-    #organizer = DocumentOrganizer(output_dir)
-    #organizer.organize_documents(map_file_path, cliente_name, proyecto_menor)  # Aquí se usa cliente_base_path
-
-    #logger.info("Documentos organizados en carpetas correctamente.")
-
-except Exception as e:
-    logger.exception("Error durante el procesamiento del documento.")
+        logger.error(f"{e} Finalizando.")
+        return EXIT_CONFIGURACION
+
+    # Índices de títulos de las plantillas, una sola vez para todo el lote
+    precargar_plantillas("config")
+
+    # Flujo principal
+    cache = ProcessingCache(output_dir) if use_cache and not args.sin_cache else None
+    try:
+        resultados = procesar_lote(entradas, keywords, output_dir, map_file_path, workers=workers,
+                                   log_file_path=log_file_path, export_sections=export_sections,
+                                   streaming=streaming, cache=cache)
+
+        logger.info("Procesamiento y exportación completados exitosamente.")
+
+        # Organizar documentos
+        #organizer = DocumentOrganizer(output_dir)
+        #organizer.organize_documents(map_file_path, cliente_name, proyecto_menor)  # Aquí se usa cliente_base_path
+
+        #logger.info("Documentos organizados en carpetas correctamente.")
+
+    except Exception as e:
+        logger.exception("Error durante el procesamiento del documento.")
+        return EXIT_ERRORES
+    finally:
+        if cache is not None:
+            cache.close()
+
+    ruta_resumen = args.resumen or os.path.join(output_dir, f"resumen_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    resumen = escribir_resumen(resultados, ruta_resumen, duracion=time.perf_counter() - inicio,
+                               ruta_prometheus=metrics_textfile)
+    return EXIT_ERRORES if resumen["errores"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from mapeo import hash_memorizado
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = ".ing_solicitudes_cache.sqlite"
+
+
+class _TablaHashes:
+    """Tabla `hashes` de la caché vista como memo de `hash_memorizado`: ruta -> ((mtime_ns, tamaño), sha256)."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+
+    def get(self, ruta):
+        row = self._connection.execute("SELECT mtime_ns, size, sha256 FROM hashes WHERE ruta = ?", (ruta,)).fetchone()
+        return ((row[0], row[1]), row[2]) if row else None
+
+
+    def __setitem__(self, ruta, valor):
+        (mtime_ns, size), sha256 = valor
+        self._connection.execute(
+            "INSERT OR REPLACE INTO hashes (ruta, mtime_ns, size, sha256) VALUES (?, ?, ?, ?)",
+            (ruta, mtime_ns, size, sha256),
+        )
+        self._connection.commit()
+
+
+class ProcessingCache:
+    """
+    Caché persistente (SQLite, en la carpeta de salida) de las solicitudes ya procesadas.
+
+    La clave combina la ruta y el hash del documento de entrada, el de las keywords, el del mapeo,
+    el de las plantillas y las opciones que cambian la salida; si coincide y los archivos generados siguen en disco con el mismo
+    contenido (se guarda el SHA-256 de cada uno), la entrada se puede saltar sin volver a leerla.
+    """
+
+    def __init__(self, output_dir):
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(output_dir, exist_ok=True)
+        self.db_path = os.path.join(output_dir, CACHE_FILE)
+        self._connection = sqlite3.connect(self.db_path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                ruta TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS solicitudes (
+                clave TEXT PRIMARY KEY,
+                archivo TEXT NOT NULL,
+                secciones TEXT NOT NULL,
+                salidas TEXT NOT NULL,
+                fecha TEXT NOT NULL
+            );
+        """)
+        self._connection.commit()
+        self._hashes = _TablaHashes(self._connection)
+
+
+    def file_hash(self, file_path):
+        """SHA-256 de un archivo; solo se recalcula si cambian su fecha de modificación o su tamaño."""
+        return hash_memorizado(file_path, self._hashes)
+
+
+    def key(self, file_path, keywords, map_file_path, proyecto_menor, export_sections, export_format="docx",
+            streaming=False, plantillas=None):
+        """
+        Clave de caché de una entrada. Incluye su ruta (cada archivo tiene sus propias salidas aunque
+        otro tenga el mismo contenido), el lector usado y `plantillas`, la firma de las plantillas
+        que puede rellenar (`plantillas.firma_plantillas`).
+        """
+        partes = [
+            os.path.abspath(file_path),
+            self.file_hash(file_path),
+            hashlib.sha256("\n".join(keywords).encode("utf-8")).hexdigest(),
+            self.file_hash(map_file_path),
+            f"proyecto_menor={bool(proyecto_menor)}",
+            f"export_sections={bool(export_sections)}",
+            f"streaming={bool(streaming)}",
+            f"plantillas={plantillas}",
+        ]
+        if export_format != "docx":
+            partes.append(f"export_format={export_format}")
+        return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+    def get(self, key):
+        """
+        Devuelve {secciones, salidas} si la entrada está en caché y sus salidas siguen en disco sin
+        cambios (p. ej. no las ha sobrescrito otra entrada); si no, None.
+        """
+        row = self._connection.execute(
+            "SELECT secciones, salidas FROM solicitudes WHERE clave = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        salidas = json.loads(row[1])
+        if not isinstance(salidas, dict):
+            return None  # Registro de una versión anterior, sin el hash de las salidas
+        for salida, sha256 in salidas.items():
+            if not os.path.exists(salida) or self.file_hash(salida) != sha256:
+                self.logger.info(f"Salida en caché eliminada o modificada ({salida}); se vuelve a procesar.")
+                return None
+        return {"secciones": json.loads(row[0]), "salidas": list(salidas)}
+
+
+    def put(self, key, file_path, secciones, salidas):
+        """Registra una entrada procesada con las secciones encontradas y el hash de los archivos generados."""
+        hashes = {salida: self.file_hash(salida) if os.path.exists(salida) else None for salida in salidas}
+        self._connection.execute(
+            "INSERT OR REPLACE INTO solicitudes (clave, archivo, secciones, salidas, fecha) VALUES (?, ?, ?, ?, ?)",
+            (key, os.path.abspath(file_path), json.dumps(secciones, ensure_ascii=False),
+             json.dumps(hashes, ensure_ascii=False), datetime.now().isoformat(timespec="seconds")),
+        )
+        self._connection.commit()
+
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,230 @@
+import copy
+import logging
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from secciones import SectionXml
+
+logger = logging.getLogger(__name__)
+
+_P, _TBL, _R = qn("w:p"), qn("w:tbl"), qn("w:r")
+_HYPERLINK, _DOC_PR, _SECT_PR = qn("w:hyperlink"), qn("wp:docPr"), qn("w:sectPr")
+_NUM_ID, _NUM_PR, _BASED_ON, _NSID = qn("w:numId"), qn("w:numPr"), qn("w:basedOn"), qn("w:nsid")
+_NUM_ID_ATTR, _ABSTRACT_NUM_ID, _VAL = qn("w:numId"), qn("w:abstractNumId"), qn("w:val")
+_REL_ATTRS = (qn("r:embed"), qn("r:link"), qn("r:id"))
+
+# Marcas que apuntan a partes que no se copian (comentarios, notas) o que solo tienen sentido en el origen (marcadores)
+_DROPPED = tuple(qn(tag) for tag in (
+    "w:bookmarkStart", "w:bookmarkEnd", "w:commentRangeStart", "w:commentRangeEnd",
+))
+_DROPPED_RUNS = tuple(qn(tag) for tag in ("w:commentReference", "w:footnoteReference", "w:endnoteReference"))
+_STYLE_REFS = ".//w:pStyle/@w:val | .//w:rStyle/@w:val | .//w:tblStyle/@w:val"
+
+
+def body_elements(first, stop=None):
+    """Elementos `w:p` y `w:tbl` del cuerpo posteriores a `first` y anteriores a `stop` (o hasta el final)."""
+    elements = []
+    element = first.getnext()
+    while element is not None and element is not stop:
+        if element.tag in (_P, _TBL):
+            elements.append(element)
+        element = element.getnext()
+    return elements
+
+
+def _numbering_element(part):
+    """Elemento `w:numbering` del documento o None si no tiene parte de numeración."""
+    try:
+        return part.part_related_by(RT.NUMBERING).element
+    except KeyError:
+        return None
+
+
+def _capture_styles(document, elements):
+    """Copias de los estilos usados por los elementos, incluida la cadena de `w:basedOn`."""
+    styles_element = document.styles.element
+    styles = {}
+    pending = {style_id for element in elements for style_id in element.xpath(_STYLE_REFS)}
+    while pending:
+        style_id = pending.pop()
+        if style_id in styles:
+            continue
+        style = styles_element.get_by_id(style_id)
+        if style is None:
+            continue
+        styles[style_id] = copy.deepcopy(style)
+        based_on = style.find(_BASED_ON)
+        if based_on is not None:
+            pending.add(based_on.get(_VAL))
+    return styles
+
+
+def _capture_numbering(part, elements):
+    """Copias de las definiciones de lista (`w:num` y su `w:abstractNum`) a las que remiten los elementos."""
+    numbering_element = _numbering_element(part)
+    numbering = {}
+    if numbering_element is None:
+        return numbering
+
+    for element in elements:
+        for num_id in element.iter(_NUM_ID):
+            value = num_id.get(_VAL)
+            if value in numbering or not value or not value.isdigit():
+                continue
+            try:
+                num = numbering_element.num_having_numId(int(value))
+            except KeyError:
+                continue
+            abstract = numbering_element.xpath(f'./w:abstractNum[@w:abstractNumId="{num.abstractNumId.val}"]')
+            numbering[value] = (copy.deepcopy(num), copy.deepcopy(abstract[0]) if abstract else None)
+    return numbering
+
+
+def capture_section_xml(document, elements, image_block):
+    """
+    Copia los elementos del cuerpo de una sección junto con lo que necesitan de su documento:
+    imágenes (mediante `image_block(parte de imagen)`), enlaces externos, estilos y numeración.
+    El resultado no guarda referencias al documento de origen.
+    """
+    part = document.part
+    copies = tuple(copy.deepcopy(element) for element in elements)
+    images, links = {}, {}
+    for element in copies:
+        for node in element.iter():
+            for attr in _REL_ATTRS:
+                rId = node.get(attr)
+                if rId is None or rId in images or rId in links or rId not in part.rels:
+                    continue
+                rel = part.rels[rId]
+                if rel.is_external:
+                    links[rId] = (rel.reltype, rel.target_ref)
+                elif rel.reltype == RT.IMAGE:
+                    images[rId] = image_block(rel.target_part)
+
+    styles = _capture_styles(document, copies)
+    numbering = _capture_numbering(part, list(copies) + list(styles.values()))
+    return SectionXml(copies, images, links, styles, numbering)
+
+
+def _import_numbering(part, section_xml, used):
+    """
+    Añade al destino las listas `used` de la sección con identificadores nuevos; devuelve numId de
+    origen -> nuevo (None si el destino no tiene dónde añadirlas).
+    """
+    used = [num_id for num_id in section_xml.numbering if num_id in used]
+    if not used:
+        return {}
+    numbering_element = _numbering_element(part)
+    if numbering_element is None:
+        return None
+
+    next_abstract = max((int(value) for value in numbering_element.xpath("./w:abstractNum/@w:abstractNumId")), default=-1) + 1
+    num_ids = {}
+    abstract_ids = {}
+    for source_id in used:
+        num, abstract = section_xml.numbering[source_id]
+        source_abstract = num.abstractNumId.val
+        if source_abstract not in abstract_ids:
+            if abstract is None:
+                continue
+            abstract = copy.deepcopy(abstract)
+            abstract.set(_ABSTRACT_NUM_ID, str(next_abstract))
+            for nsid in abstract.findall(_NSID):
+                abstract.remove(nsid)  # Con el mismo nsid Word podría fundir la lista copiada con la original
+            numbering_element.insert_element_before(abstract, "w:num", "w:numIdMacAtCleanup")
+            abstract_ids[source_abstract] = next_abstract
+            next_abstract += 1
+
+        num = copy.deepcopy(num)
+        new_id = numbering_element._next_numId
+        num.set(_NUM_ID_ATTR, str(new_id))
+        num.abstractNumId.val = abstract_ids[source_abstract]
+        numbering_element.insert_element_before(num, "w:numIdMacAtCleanup")
+        num_ids[source_id] = str(new_id)
+    return num_ids
+
+
+def _remap_numbering(element, num_ids):
+    """Cambia los numId al destino; si la lista no se pudo importar se quita la numeración del párrafo."""
+    for num_id in list(element.iter(_NUM_ID)):
+        new_id = num_ids.get(num_id.get(_VAL)) if num_ids is not None else None
+        if new_id is not None:
+            num_id.set(_VAL, new_id)
+        elif num_id.getparent().tag == _NUM_PR:
+            num_pr = num_id.getparent()
+            num_pr.getparent().remove(num_pr)
+
+
+def _missing_styles(document, section_xml):
+    """Copias de los estilos de la sección que el destino no tiene; los existentes se respetan."""
+    styles_element = document.styles.element
+    return [
+        copy.deepcopy(style) for style_id, style in section_xml.styles.items()
+        if styles_element.get_by_id(style_id) is None
+    ]
+
+
+def _remap_relationships(element, rIds):
+    """Sustituye los r:id de origen por los del destino y quita lo que remite a partes no copiadas."""
+    orphans = []
+    for node in element.iter():
+        tag = node.tag
+        if tag in _DROPPED or tag == _SECT_PR:
+            # Los saltos de sección del origen arrastran referencias a sus encabezados y pies
+            orphans.append(node)
+            continue
+        if tag in _DROPPED_RUNS:
+            orphans.append(node.getparent())
+            continue
+        for attr in _REL_ATTRS:
+            rId = node.get(attr)
+            if rId is None:
+                continue
+            if rId in rIds:
+                node.set(attr, rIds[rId])
+            elif tag == _HYPERLINK:
+                del node.attrib[attr]
+            else:
+                # Gráfico, objeto incrustado, etc.: se quita el run que lo contiene
+                run = next((ancestor for ancestor in node.iterancestors(_R)), node)
+                orphans.append(run)
+
+    for node in orphans:
+        parent = node.getparent()
+        if parent is not None:
+            parent.remove(node)
+
+
+def insert_section_xml(section_xml, document, anchor, image_rId):
+    """
+    Inserta tras `anchor` una copia de los elementos de la sección, en orden y en bloque, y devuelve
+    el último elemento insertado. `image_rId(parte, ImageBlock)` devuelve el r:id de la imagen en el
+    documento destino; estilos, listas y enlaces externos se añaden al destino con identificadores nuevos.
+    """
+    part = document.part
+    rIds = {rId: image_rId(part, image) for rId, image in section_xml.images.items()}
+    for rId, (reltype, target) in section_xml.links.items():
+        rIds[rId] = part.relate_to(target, reltype, is_external=True)
+
+    # Solo se importan las listas que usan los elementos o los estilos que hay que añadir
+    styles = _missing_styles(document, section_xml)
+    used = {num_id.get(_VAL) for element in (*section_xml.elements, *styles) for num_id in element.iter(_NUM_ID)}
+    num_ids = _import_numbering(part, section_xml, used)
+    for style in styles:
+        _remap_numbering(style, num_ids)
+        document.styles.element.append(style)
+
+    # Los id de las formas deben ser únicos en el documento: se calcula el siguiente libre una sola vez
+    next_id = part.next_id
+    for element in section_xml.elements:
+        clone = copy.deepcopy(element)
+        _remap_relationships(clone, rIds)
+        _remap_numbering(clone, num_ids)
+        for doc_pr in clone.iter(_DOC_PR):
+            doc_pr.set("id", str(next_id))
+            next_id += 1
+
+        anchor.addnext(clone)
+        anchor = clone
+
+    logger.debug("Insertados %d elementos en bloque.", len(section_xml.elements))
+    return anchor
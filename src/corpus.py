@@ -0,0 +1,156 @@
+import os
+import json
+import shutil
+import logging
+import importlib.util
+import threading
+from docx.image.image import Image
+from docx.image.exceptions import UnrecognizedImageError
+
+logger = logging.getLogger(__name__)
+
+CORPUS_FORMATS = ("jsonl", "parquet")
+CORPUS_FILE = "secciones.jsonl"
+IMAGES_DIR = "imagenes"
+PARQUET_BATCH = 1000  # Secciones por grupo de filas al convertir a Parquet
+
+
+def _image_extension(data):
+    """Extensión de la imagen según su cabecera; "bin" si python-docx no reconoce el formato."""
+    try:
+        return Image.from_blob(data).ext
+    except UnrecognizedImageError:
+        return "bin"
+
+
+def _flag(value):
+    """Negrita, cursiva o subrayado como bool o None (heredado); el subrayado puede venir como `WD_UNDERLINE`."""
+    return None if value is None else bool(value)
+
+
+class SectionCorpus:
+    """
+    Corpus de secciones en JSONL: una línea por sección con su título, documento de origen, página
+    del índice y bloques (párrafos con formato e imágenes). Cada imagen distinta se guarda una sola
+    vez en `imagenes/<hash>.<ext>` junto al archivo y las líneas solo guardan su hash y su ruta.
+
+    Las secciones se añaden al final del archivo según se exportan, sin reescribir lo anterior.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.images_dir = os.path.join(os.path.dirname(os.path.abspath(path)), IMAGES_DIR)
+        self._lock = threading.Lock()
+        self._images = {}  # hash -> ruta relativa de la imagen ya guardada
+
+
+    def _save_image(self, image):
+        """Guarda la imagen si aún no está en la carpeta de imágenes y devuelve su ruta relativa al corpus."""
+        relative = self._images.get(image.digest)
+        if relative is not None:
+            return relative
+
+        data = image.data
+        name = f"{image.digest}.{_image_extension(data)}"
+        path = os.path.join(self.images_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(self.images_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+
+        relative = f"{IMAGES_DIR}/{name}"
+        self._images[image.digest] = relative
+        return relative
+
+
+    def record(self, title, content, source_file=None, page=None):
+        """Registro de una sección: {titulo, archivo, pagina, bloques}."""
+        blocks = []
+        for element in content:
+            if element.type == "text":
+                blocks.append({
+                    "tipo": "texto",
+                    "texto": element.text,
+                    "runs": [
+                        {"texto": run.text, "negrita": _flag(run.bold), "cursiva": _flag(run.italic), "subrayado": _flag(run.underline)}
+                        for run in element.runs
+                    ],
+                })
+            elif element.type == "image":
+                cx, cy = element.extent or (None, None)
+                blocks.append({"tipo": "imagen", "hash": element.digest, "imagen": self._save_image(element), "cx": cx, "cy": cy})
+        return {"titulo": title, "archivo": source_file, "pagina": page, "bloques": blocks}
+
+
+    def append(self, title, content, source_file=None, page=None):
+        """Añade una sección al final del corpus."""
+        line = json.dumps(self.record(title, content, source_file, page), ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+
+
+    def merge(self, other_path):
+        """Añade al final las secciones de otro corpus (p. ej. el de un worker) y mueve sus imágenes. Devuelve cuántas líneas añadió."""
+        other_images = os.path.join(os.path.dirname(os.path.abspath(other_path)), IMAGES_DIR)
+        if os.path.isdir(other_images):
+            os.makedirs(self.images_dir, exist_ok=True)
+            for name in os.listdir(other_images):
+                target = os.path.join(self.images_dir, name)
+                if not os.path.exists(target):
+                    os.replace(os.path.join(other_images, name), target)
+            shutil.rmtree(other_images, ignore_errors=True)
+
+        lines = 0
+        if os.path.exists(other_path):
+            with self._lock:
+                with open(other_path, "r", encoding="utf-8") as source, open(self.path, "a", encoding="utf-8") as file:
+                    for line in source:
+                        file.write(line)
+                        lines += 1
+            os.remove(other_path)
+        return lines
+
+
+def parquet_disponible():
+    """True si está instalado pyarrow, necesario para escribir Parquet."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def parquet_path(jsonl_path):
+    return os.path.splitext(jsonl_path)[0] + ".parquet"
+
+
+def convert_to_parquet(jsonl_path, batch_size=PARQUET_BATCH):
+    """
+    Convierte un corpus JSONL en Parquet (mismo nombre, extensión .parquet) leyéndolo por lotes,
+    sin cargarlo entero en memoria, y elimina el JSONL. Requiere pyarrow (dependencia opcional).
+    Devuelve la ruta del archivo resultante.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    run = pa.struct([("texto", pa.string()), ("negrita", pa.bool_()), ("cursiva", pa.bool_()), ("subrayado", pa.bool_())])
+    block = pa.struct([
+        ("tipo", pa.string()), ("texto", pa.string()), ("runs", pa.list_(run)),
+        ("hash", pa.string()), ("imagen", pa.string()), ("cx", pa.int64()), ("cy", pa.int64()),
+    ])
+    schema = pa.schema([("titulo", pa.string()), ("archivo", pa.string()), ("pagina", pa.int64()), ("bloques", pa.list_(block))])
+
+    target = parquet_path(jsonl_path)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(jsonl_path, "r", encoding="utf-8") as file, pq.ParquetWriter(tmp_path, schema) as writer:
+        batch = []
+        for line in file:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    os.replace(tmp_path, target)
+    os.remove(jsonl_path)
+    logger.info("Corpus convertido a Parquet: %s", target)
+    return target
@@ -2,19 +2,82 @@ from docx import Document
 import os
 import re
 import logging
+import threading
 from docx.shared import Inches
-from docx.oxml.ns import qn
-from PIL import Image
 from io import BytesIO
-import base64
-from docx.oxml import OxmlElement
+from zipfile import ZipFile, ZIP_DEFLATED
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from docx.opc.pkgwriter import PackageWriter
+from docx.oxml.shape import CT_Inline
 from docx.shared import Pt
+import weakref
+from metricas import cronometrar, medir, contar
+from secciones import TextRun, ImageBlock
+from clonado import insert_section_xml
+from corpus import SectionCorpus, CORPUS_FORMATS, CORPUS_FILE
+
+IMAGE_WIDTH = Inches(4)
+EXPORT_WORKERS = config("EXPORT_WORKERS", default=1, cast=int)  # Hilos para escribir secciones en paralelo
+DOCX_COMPRESSLEVEL = config("DOCX_COMPRESSLEVEL", default=6, cast=int)  # Nivel de zlib de los .docx (0-9)
+EXPORT_FORMATS = ("docx",) + CORPUS_FORMATS
+EXPORT_FORMAT = config("EXPORT_FORMAT", default="docx").strip().lower()  # Uno de EXPORT_FORMATS
+
+
+class _ZipWriter:
+    """Escritor de paquetes OPC para `PackageWriter` con nivel de compresión configurable."""
+
+    def __init__(self, file, compresslevel):
+        self._zipf = ZipFile(file, "w", compression=ZIP_DEFLATED, compresslevel=compresslevel)
+
+    def write(self, pack_uri, blob):
+        self._zipf.writestr(pack_uri.membername, blob)
+
+    def close(self):
+        self._zipf.close()
+
+
+def save_document(document, path, compresslevel=DOCX_COMPRESSLEVEL):
+    """
+    Guarda el documento como `Document.save()`, pero con el nivel de compresión indicado y de forma
+    atómica: se escribe en un temporal junto al destino y se renombra, así que nunca queda un .docx a medias.
+    """
+    package = document.part.package
+    parts = package.parts
+    for part in parts:
+        part.before_marshal()
+
+    path = os.fspath(path)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            writer = _ZipWriter(file, compresslevel)
+            # Mismos pasos que PackageWriter.write(); son métodos internos, por eso python-docx va fijado en requirements.txt
+            PackageWriter._write_content_types_stream(writer, parts)
+            PackageWriter._write_pkg_rels(writer, package.rels)
+            PackageWriter._write_parts(writer, parts)
+            writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 
 class DocumentExporter:
-    def __init__(self, sections, output_dir):
+    def __init__(self, sections, output_dir, workers=None, compresslevel=None, source_file=None, pages=None, corpus_path=None):
         self.sections = sections
         self.output_dir = output_dir
+        self.source_file = source_file  # Documento de origen y página del índice de cada título, para el corpus
+        self.pages = pages or {}
+        self.corpus_path = corpus_path or os.path.join(output_dir, CORPUS_FILE)
+        self._corpus = None
+        self.workers = workers or EXPORT_WORKERS  # Con más de uno, `export_all_sections` escribe las secciones en paralelo
+        self.compresslevel = DOCX_COMPRESSLEVEL if compresslevel is None else compresslevel
         self.logger = logging.getLogger(__name__)  # Logger para el exportador
+        self.exported_files = []  # Rutas de los documentos exportados
+        self._embedded_images = weakref.WeakKeyDictionary()  # parte del documento destino -> {hash: (rId, nombre, cx, cy)}
+        self._embedded_images_lock = threading.Lock()  # Los hilos de export_all_sections comparten el diccionario
 
 
     def create_or_get_style(self, doc, style_name):
@@ -35,7 +98,46 @@ class DocumentExporter:
 
 
     def export_section(self, title, export_format="docx"):
-        """Exporta una sección específica basada en el título."""
+        """Exporta una sección específica basada en el título y devuelve la ruta del archivo (None si falla)."""
+        if export_format in CORPUS_FORMATS:
+            return self._append_to_corpus(title)
+        file_name = self._write_section(title, export_format)
+        if file_name:
+            self.exported_files.append(file_name)
+        return file_name
+
+
+    @cronometrar("exportar.append_to_corpus")
+    def _append_to_corpus(self, title):
+        """
+        Añade la sección al corpus JSONL de `corpus_path`. Con "parquet" también se escribe en JSONL:
+        el corpus se convierte al final de la ejecución (`corpus.convert_to_parquet`).
+        """
+        try:
+            if title not in self.sections:
+                self.logger.error(f"Título no encontrado: {title}")
+                return
+
+            if self._corpus is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.corpus_path)), exist_ok=True)
+                self._corpus = SectionCorpus(self.corpus_path)
+            self._corpus.append(title, self.sections[title], self.source_file, self.pages.get(title))
+            contar("secciones_exportadas")
+            if self.corpus_path not in self.exported_files:
+                self.exported_files.append(self.corpus_path)
+            self.logger.debug("Sección '%s' añadida al corpus %s", title, self.corpus_path)
+            return self.corpus_path
+        except Exception as e:
+            self.logger.exception(f"Error al añadir la sección '{title}' al corpus: {e}")
+            return None
+
+
+    @cronometrar("exportar.export_section")
+    def _write_section(self, title, export_format="docx"):
+        """
+        Construye y guarda el documento de una sección. Admite hilos: cada llamada trabaja sobre su
+        propio documento y la caché de imágenes incrustadas, compartida, se consulta bajo candado.
+        """
         try:
             if title not in self.sections:
                 self.logger.error(f"Título no encontrado: {title}")
@@ -50,22 +152,33 @@ class DocumentExporter:
             heading = new_doc.add_paragraph(style=custom_style)
             heading_run = heading.add_run(title)
 
-            for element in self.sections[title]:
-                if element["type"] == "text":
+            # Con el XML de la sección solo se rehace su título: párrafos y tablas se copian después en bloque
+            content = self.sections[title]
+            section_xml = getattr(content, "xml", None)
+            para = heading
+            for element in (content[:1] if section_xml is not None else content):
+                if element.type == "text":
                     para = new_doc.add_paragraph()
-                    self._add_formatted_text(para, element["content"])
-                elif element["type"] == "image":
-                    image_run = element["content"]  # El objeto `Run` que contiene la imagen
+                    self._add_formatted_text(para, element.runs)
+                elif element.type == "image":
                     para = new_doc.add_paragraph()  # Crear un párrafo para la imagen
-                    self._add_image_to_document(para, image_run)
+                    self._add_image_to_document(para, element)
+
+            if section_xml is not None:
+                self._insert_xml(new_doc, para._p, section_xml)
 
             # Guardar archivo
             sanitized_title = re.sub(r'[\\/*?:"<>|]', "", title)  # Evitar caracteres no válidos en nombres de archivo
             file_name = f"{self.output_dir}/{sanitized_title}.{export_format}"
-            new_doc.save(file_name)
-            self.logger.info(f"Documento exportado: {file_name}")
+            with medir("exportar.guardar"):
+                save_document(new_doc, file_name, self.compresslevel)
+            contar("secciones_exportadas")
+            contar("bytes_escritos", os.path.getsize(file_name))
+            self.logger.info("Documento exportado: %s", file_name)
+            return file_name
         except Exception as e:
             self.logger.exception(f"Error al exportar la sección '{title}': {e}")
+            return None
 
 
     def _add_formatted_text(self, para, text_elements):
@@ -75,6 +188,11 @@ class DocumentExporter:
                 if isinstance(element, str):
                     # Si el elemento es un string plano, agrégalo directamente
                     para.add_run(element)
+                elif isinstance(element, TextRun):
+                    run = para.add_run(element.text)
+                    run.bold = element.bold
+                    run.italic = element.italic
+                    run.underline = element.underline
                 elif isinstance(element, dict) and "text" in element:
                     # Si el elemento es un dict con formato, aplica los estilos
                     run = para.add_run(element["text"])
@@ -82,42 +200,57 @@ class DocumentExporter:
                     run.italic = element.get("italic", False)
                     run.underline = element.get("underline", False)
                 else:
-                    self.logger.warning(f"Formato inesperado en texto: {element}")
+                    self.logger.warning("Formato inesperado en texto: %r", element)
         except Exception as e:
             self.logger.exception(f"Error al agregar texto con formato: {e}")
 
 
-    def _add_image_to_document(self, paragraph, image_run):
-        """Agrega una imagen extraída desde un objeto `Run` al párrafo."""
-        try:
-            # Extraer los datos binarios de la imagen desde el `Run`
-            blip_elements = image_run._element.xpath(".//a:blip")
-            if not blip_elements:
-                self.logger.warning("No se encontraron datos de imagen en el `Run`.")
-                return
+    def _image_rId(self, document_part, image, width=IMAGE_WIDTH):
+        """Devuelve (rId, nombre, cx, cy) de la imagen en el documento destino; cada imagen distinta se incrusta una sola vez."""
+        # Cada documento lo escribe un solo hilo, así que solo el acceso al diccionario compartido va bajo el candado
+        with self._embedded_images_lock:
+            embedded = self._embedded_images.setdefault(document_part, {})
+        digest = image.digest
+
+        if digest not in embedded:
+            # Primera aparición en este documento: se añaden los bytes (leídos ahora si la imagen es diferida)
+            rId, picture = document_part.get_or_add_image(BytesIO(image.data))
+            cx, cy = picture.scaled_dimensions(width, None)
+            embedded[digest] = (rId, picture.filename, cx, cy)
+            contar("imagenes_incrustadas")
+        return embedded[digest]
 
-            embed = blip_elements[0].get(qn("r:embed"))
-            part = image_run.part.related_parts[embed]
-            image_data = part.blob
 
-            # Guardar temporalmente la imagen
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                temp_file.write(image_data)
-                temp_file.flush()
-                temp_image_path = temp_file.name
+    def _embed_image(self, paragraph, image, width=IMAGE_WIDTH):
+        """Agrega la imagen en un nuevo `Run`."""
+        document_part = paragraph.part
+        rId, filename, cx, cy = self._image_rId(document_part, image, width)
+        inline = CT_Inline.new_pic_inline(document_part.next_id, rId, filename, cx, cy)
+        paragraph.add_run()._r.add_drawing(inline)
+        contar("imagenes_insertadas")
 
-            # Agregar la imagen al párrafo en un nuevo `Run`
-            run = paragraph.add_run()
-            run.add_picture(temp_image_path, width=Inches(4))
 
-            # Eliminar el archivo temporal
-            os.remove(temp_image_path)
+    def _insert_xml(self, document, anchor, section_xml):
+        """Inserta en bloque tras `anchor` los elementos copiados de la sección y devuelve el último."""
+        last = insert_section_xml(
+            section_xml, document, anchor, lambda part, image: self._image_rId(part, image)[0]
+        )
+        contar("elementos_clonados", len(section_xml.elements))
+        return last
+
+
+    def _add_image_to_document(self, paragraph, image):
+        """Agrega al párrafo una imagen dada como `ImageBlock` o directamente como bytes."""
+        try:
+            if isinstance(image, bytes):
+                image = ImageBlock.from_bytes(image)
+            self._embed_image(paragraph, image)
 
         except Exception as e:
             self.logger.exception(f"Error al agregar imagen al documento: {e}")
 
 
+    @cronometrar("exportar.export_all_sections")
     def export_all_sections(self, export_format="docx"):
         """Exporta todas las secciones disponibles."""
         if not self.sections:
@@ -126,8 +259,19 @@ class DocumentExporter:
 
         try:
             os.makedirs(self.output_dir, exist_ok=True)
-            for title in self.sections:
-                self.export_section(title, export_format=export_format)
+            workers = min(self.workers, len(self.sections))
+            if export_format in CORPUS_FORMATS:
+                # Un único archivo para todas las secciones, escrito en orden
+                for title in self.sections:
+                    self._append_to_corpus(title)
+            elif workers > 1:
+                # La compresión zlib del guardado libera el GIL: varias secciones se escriben a la vez
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exportar") as pool:
+                    file_names = list(pool.map(lambda title: self._write_section(title, export_format), self.sections))
+                self.exported_files.extend(file_name for file_name in file_names if file_name)
+            else:
+                for title in self.sections:
+                    self.export_section(title, export_format=export_format)
             self.logger.info("Todas las secciones se han exportado correctamente.")
         except Exception as e:
             self.logger.exception(f"Error al exportar las secciones: {e}")
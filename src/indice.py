@@ -0,0 +1,177 @@
+import re
+import logging
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from lxml import etree
+from docx.oxml.ns import nsmap, qn
+from docx.styles import BabelFish
+
+logger = logging.getLogger(__name__)
+
+MATCHER_AHO_CORASICK = "aho-corasick"
+MATCHER_REGEX = "regex"
+
+_FLD_CHAR = qn("w:fldChar")
+_INSTR_TEXT = qn("w:instrText")
+_FLD_SIMPLE = qn("w:fldSimple")
+_STYLE, _NAME, _VAL = qn("w:style"), qn("w:name"), qn("w:val")
+# Párrafo dentro de un control de contenido marcado como tabla de contenido
+_TOC_GALLERY = etree.XPath(
+    "../../w:sdtPr/w:docPartObj/w:docPartGallery[contains(@w:val, 'Table of Contents')]", namespaces=nsmap
+)
+
+
+def load_keywords(file_path):
+    """Carga las palabras clave desde un archivo."""
+    logger.debug("Intentando abrir el archivo: %s", file_path)
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            logger.debug("Archivo abierto exitosamente: %s", file_path)
+            keywords = [line.strip() for line in file if line.strip()]
+            logger.info("Keywords cargadas: %d", len(keywords))
+            logger.debug("Keywords: %s", keywords)
+            return keywords
+    except Exception as e:
+        logger.exception(f"Error al cargar las keywords desde {file_path}: {e}")
+        return []
+
+
+def nombres_estilos(styles_element):
+    """
+    Recorre el elemento `w:styles` y devuelve id de estilo -> nombre (como `style.name` de
+    python-docx) y el nombre del estilo de párrafo por defecto.
+    """
+    style_names = {}
+    default_name = ""
+    for style in styles_element.iter(_STYLE):
+        name_element = style.find(_NAME)
+        name = BabelFish.internal2ui(name_element.get(_VAL)) if name_element is not None else ""
+        style_names[style.get(qn("w:styleId"))] = name
+        if style.get(qn("w:type")) == "paragraph" and style.get(qn("w:default")) in ("1", "true", "on"):
+            default_name = name
+    return style_names, default_name
+
+
+def normalizar(texto):
+    """Pliega mayúsculas y acentos ("Climatización" -> "climatizacion") para comparar títulos."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+class AhoCorasick:
+    """Autómata de Aho-Corasick sobre texto normalizado: la búsqueda es lineal en el texto e independiente del número de keywords."""
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [False]
+
+        for keyword in keywords:
+            node = 0
+            for char in normalizar(keyword):
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(False)
+                    self._goto[node][char] = next_node
+                node = next_node
+            if node:
+                self._output[node] = True
+
+        # Enlaces de fallo en anchura: cada nodo apunta al sufijo propio más largo presente en el trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] or self._output[self._fail[child]]
+
+    def search(self, text):
+        """Devuelve True si el texto contiene alguna de las keywords."""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in normalizar(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                return True
+        return False
+
+
+class RegexMatcher:
+    """Matcher original: una alternancia de todas las keywords, sin distinguir mayúsculas."""
+
+    def __init__(self, keywords):
+        pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+        self._regex = re.compile(pattern, re.IGNORECASE)
+
+    def search(self, text):
+        return self._regex.search(text) is not None
+
+
+@lru_cache(maxsize=16)
+def _crear_matcher(keywords, tipo):
+    if tipo == MATCHER_AHO_CORASICK:
+        return AhoCorasick(keywords)
+    if tipo == MATCHER_REGEX:
+        return RegexMatcher(keywords)
+    raise ValueError(f"Tipo de matcher desconocido: {tipo}")
+
+
+def crear_matcher(keywords, tipo=MATCHER_AHO_CORASICK):
+    """Devuelve un matcher con método `search(texto)`; se reutiliza mientras no cambien las keywords."""
+    return _crear_matcher(tuple(keywords), tipo)
+
+
+class DetectorTOC:
+    """
+    Sigue los campos de Word (w:fldChar, w:instrText, w:fldSimple) párrafo a párrafo para saber
+    si un párrafo pertenece a un campo TOC. El estado se mantiene entre párrafos porque un campo
+    TOC empieza en un párrafo y termina varios párrafos después.
+    """
+
+    def __init__(self):
+        self._fields = []  # pila de [instrucción acumulada, es_toc]
+
+    def _in_toc(self):
+        return any(es_toc for _, es_toc in self._fields)
+
+    def procesar(self, p_element):
+        """Actualiza el estado con los campos del párrafo y devuelve True si alguna parte está dentro de un TOC."""
+        en_toc = self._in_toc()
+        for element in p_element.iter(_FLD_CHAR, _INSTR_TEXT, _FLD_SIMPLE):
+            if element.tag == _FLD_CHAR:
+                tipo = element.get(qn("w:fldCharType"))
+                if tipo == "begin":
+                    self._fields.append(["", False])
+                elif tipo == "end" and self._fields:
+                    self._fields.pop()
+            elif element.tag == _INSTR_TEXT:
+                if self._fields:
+                    # La instrucción puede venir partida en varios runs
+                    field = self._fields[-1]
+                    field[0] += element.text or ""
+                    field[1] = field[0].strip().upper().startswith("TOC")
+            elif (element.get(qn("w:instr")) or "").strip().upper().startswith("TOC"):
+                en_toc = True
+            en_toc = en_toc or self._in_toc()
+        return en_toc
+
+
+    def es_indice(self, p_element, style_name, en_sdt=True):
+        """
+        Procesa el párrafo y devuelve True si pertenece a la tabla de contenido: estilo "TOC n",
+        dentro de un campo TOC o, si `en_sdt`, de un control de contenido de tabla de contenido.
+        """
+        in_field = self.procesar(p_element)
+        in_gallery = en_sdt and bool(_TOC_GALLERY(p_element))
+        return in_field or in_gallery or style_name.lower().startswith("toc")
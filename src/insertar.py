@@ -1,131 +1,216 @@
-from docx import Document
 from pathlib import Path
-import shutil
+import os
 import logging
-import pandas as pd
+from mapeo import cargar_mapeo
+from plantillas import indice_plantilla, buscar_titulo, abrir_plantilla
 from procesar import DocumentProcessor
-from exportar import DocumentExporter
-from docx.shared import Inches
+from exportar import DocumentExporter, save_document
 from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from metricas import cronometrar, medir, contar
 
 class ContentInserter:
-    def __init__(self, input_dir, config_dir, exporter: DocumentExporter):
+    def __init__(self, input_dir, config_dir, exporter: DocumentExporter, output_dir=None):
         self.input_dir = Path(input_dir).resolve()
         self.config_dir = Path(config_dir).resolve()
+        self.output_dir = Path(output_dir).resolve() if output_dir else self.input_dir  # Carpeta de las plantillas rellenas
         self.exporter = exporter  # Instancia de DocumentExporter
+        self.written_templates = []  # Rutas de las plantillas rellenas guardadas
+        self.errors = []  # Errores capturados al insertar: la plantilla afectada puede haber quedado incompleta
         self.logger = logging.getLogger(__name__)
 
 
+    @cronometrar("insertar.process_files")
     def process_files(self, mapping_file, proyecto_menor):
         """Procesa todos los archivos .docx en la carpeta de origen."""
         try:
-            mapping = pd.read_excel(mapping_file)
+            mapping = cargar_mapeo(mapping_file)
+            groups = {}
 
             for doc_file in self.input_dir.glob("*.docx"):
                 keyword = doc_file.stem.strip()
 
-                # Filtrar el mapeo por keyword
-                row = mapping[mapping['keyword'].str.strip() == keyword]
-                if row.empty:
-                    self.logger.warning(f"No se encontró un mapeo para '{keyword}'.")
+                template = self._resolve_template(keyword, mapping, proyecto_menor)
+                if template is None:
                     continue
 
-                row = row.iloc[0]
-                presentacion = row['presentacion'].strip() if pd.notna(row.get('presentacion')) else None
-                memoria = row['memoria'].strip() if pd.notna(row.get('memoria')) else None
+                # Extraer el título desde el documento de origen (el nombre del archivo es el título)
+                section_content = self._load_section_file(doc_file)
+                self._add_to_group(groups, template, doc_file.stem, section_content)
 
-                # Determinar la plantilla adecuada
-                destino_template = presentacion if proyecto_menor else memoria
-                if not destino_template:
-                    self.logger.warning(f"No se especificó una plantilla para '{keyword}' (proyecto menor: {proyecto_menor}).")
-                    continue
+            self._fill_templates(groups)
+
+        except Exception as e:
+            self.logger.exception(f"Error al procesar archivos: {e}")
+            self.errors.append(str(e))
 
-                config_folder = "presentaciones" if proyecto_menor else "memorias"
-                template_path = (self.config_dir / config_folder / destino_template).resolve()
-                self.logger.info(f"Validando plantilla en: {template_path}")
 
-                if not template_path.exists():
-                    self.logger.warning(f"Plantilla no encontrada: {template_path}")
+    @cronometrar("insertar.process_sections")
+    def process_sections(self, sections, mapping_file, proyecto_menor):
+        """Inserta directamente en las plantillas las secciones de `DocumentProcessor.get_sections()`, sin pasar por archivos intermedios."""
+        try:
+            mapping = cargar_mapeo(mapping_file)
+            groups = {}
+
+            for title, section_content in sections.items():
+                keyword = title.strip()
+
+                template = self._resolve_template(keyword, mapping, proyecto_menor)
+                if template is None:
                     continue
 
-                destino_path = (self.input_dir / destino_template).resolve()
-                shutil.copy(template_path, destino_path)
-                self.logger.info(f"Plantilla copiada desde {template_path} a {destino_path}")
+                self._add_to_group(groups, template, title, section_content)
 
-                # Procesar contenido del documento
-                self._insert_content(doc_file, destino_path)
+            self._fill_templates(groups)
 
         except Exception as e:
-            self.logger.exception(f"Error al procesar archivos: {e}")
+            self.logger.exception(f"Error al procesar secciones: {e}")
+            self.errors.append(str(e))
+
+
+    def _resolve_template(self, keyword, mapping, proyecto_menor):
+        """Busca la plantilla asociada a la keyword. Devuelve (ruta de la plantilla, ruta de destino) o None."""
+        # Buscar la keyword en el mapeo precargado
+        row = mapping.get(keyword)
+        if row is None:
+            self.logger.warning(f"No se encontró un mapeo para '{keyword}'.")
+            return None
+
+        presentacion = row['presentacion']
+        memoria = row['memoria']
+
+        # Determinar la plantilla adecuada
+        destino_template = presentacion if proyecto_menor else memoria
+        if not destino_template:
+            self.logger.warning(f"No se especificó una plantilla para '{keyword}' (proyecto menor: {proyecto_menor}).")
+            return None
+
+        config_folder = "presentaciones" if proyecto_menor else "memorias"
+        template_path = (self.config_dir / config_folder / destino_template).resolve()
+        self.logger.debug("Validando plantilla en: %s", template_path)
+
+        if not template_path.exists():
+            self.logger.warning(f"Plantilla no encontrada: {template_path}")
+            return None
+
+        destino_path = (self.output_dir / destino_template).resolve()
+        return template_path, destino_path
 
 
-    def _insert_content(self, doc_origen_path, doc_destino_path):
-        """Inserta el contenido del documento de origen en el documento de destino."""
+    def _add_to_group(self, groups, template, titulo, section_content):
+        """Agrupa las secciones por plantilla de destino, conservando el orden de llegada."""
+        if not section_content:
+            self.logger.warning(f"No se encontró contenido para la sección '{titulo}'.")
+            return
+
+        template_path, destino_path = template
+        groups.setdefault(destino_path, (template_path, []))[1].append((titulo, section_content))
+
+
+    @cronometrar("insertar.cargar_seccion")
+    def _load_section_file(self, doc_origen_path):
+        """Obtiene el contenido de la sección guardada en un .docx exportado (el nombre del archivo es el título)."""
         try:
             doc_processor = DocumentProcessor(doc_origen_path)
             doc_processor.load_document()
 
-            # Extraer el título desde el documento de origen (el nombre del archivo es el título)
-            titulo_origen = Path(doc_origen_path).stem
-
             # Obtener el contenido de la sección específica usando find_section_content
-            section_content = doc_processor.find_section_content(titulo_origen)
+            return doc_processor.find_section_content(Path(doc_origen_path).stem)
 
-            if not section_content:
-                self.logger.warning(f"No se encontró contenido para la sección '{titulo_origen}'.")
-                return
+        except Exception as e:
+            self.logger.exception(f"Error al leer la sección de '{doc_origen_path}': {e}")
+            return []
+
+
+    def _fill_templates(self, groups):
+        """Abre cada plantilla una sola vez, inserta todas sus secciones y la guarda una sola vez."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        for destino_path, (template_path, items) in groups.items():
+            try:
+                # Copia en memoria de la plantilla original: solo se lee del disco la primera vez
+                with medir("insertar.cargar_plantilla"):
+                    doc_destino = abrir_plantilla(template_path)
+                self.logger.info(f"Plantilla cargada desde {template_path} ({len(items)} secciones)")
+
+                # Índice precalculado de títulos de la plantilla y párrafos del cuerpo antes de insertar nada
+                index = indice_plantilla(template_path)
+                body_paragraphs = doc_destino.element.body.findall(qn("w:p"))
+                if len(body_paragraphs) != index["parrafos"]:
+                    raise ValueError(f"El índice de la plantilla no coincide con su contenido ({index['parrafos']} párrafos indexados, {len(body_paragraphs)} leídos).")
+
+                # Último elemento insertado tras cada título, para encadenar secciones con el mismo título en orden
+                last_inserted = {}
+                with medir("insertar.insertar_secciones"):
+                    for titulo_origen, section_content in items:
+                        self._insert_section(titulo_origen, section_content, doc_destino, last_inserted, index, body_paragraphs)
+
+                # Guardar los cambios en el documento de destino
+                with medir("insertar.guardar_plantilla"):
+                    save_document(doc_destino, destino_path, self.exporter.compresslevel)
+                contar("plantillas_escritas")
+                contar("bytes_escritos", destino_path.stat().st_size)
+                self.written_templates.append(str(destino_path))
+                self.logger.info(f"Plantilla guardada en '{destino_path}'.")
 
-            # Abrir el documento de destino
-            doc_destino = Document(doc_destino_path)
+            except Exception as e:
+                self.logger.exception(f"Error al rellenar la plantilla '{template_path}' en '{destino_path}': {e}")
+                self.errors.append(str(e))
 
-            # Buscar el título correspondiente en el cuerpo del documento con estilo que empiece con "ARTICA"
-            encontrado = False
-            for paragraph in doc_destino.paragraphs:
-                if titulo_origen.lower() in paragraph.text.lower() and paragraph.style.name.startswith("ARTICA"):
-                    encontrado = True
-                    self.logger.info(f"Apartado encontrado en el cuerpo del documento: {paragraph.text}")
 
-                    # Insertar contenido justo después del título encontrado
-                    self._insert_text_and_images(section_content, doc_destino, paragraph)
-                    break
+    def _insert_section(self, titulo_origen, section_content, doc_destino, last_inserted, index, body_paragraphs):
+        """Inserta el contenido de una sección en el documento de destino, tras el título correspondiente."""
+        try:
+            # Buscar en el índice de la plantilla el título con estilo que empiece con "ARTICA"
+            heading = buscar_titulo(index, titulo_origen)
+            if heading is None:
+                self.logger.warning("Apartado '%s' no encontrado en el cuerpo del documento destino.", titulo_origen)
+                return
 
-            if not encontrado:
-                self.logger.warning(f"Apartado '{titulo_origen}' no encontrado en el cuerpo del documento destino.")
-            else:
-                # Guardar los cambios en el documento de destino
-                doc_destino.save(doc_destino_path)
-                self.logger.info(f"Contenido de '{doc_origen_path}' insertado en '{doc_destino_path}'.")
+            position, text = heading
+            self.logger.debug("Apartado encontrado en el cuerpo del documento: %s", text)
+
+            # Insertar contenido justo después del título encontrado (o de lo ya insertado tras él)
+            anchor = body_paragraphs[position]
+            paragraph = Paragraph(anchor, doc_destino._body)
+            last_inserted[anchor] = self._insert_text_and_images(
+                section_content, doc_destino, paragraph, after=last_inserted.get(anchor)
+            )
+            contar("secciones_insertadas")
+            self.logger.info("Contenido de '%s' insertado.", titulo_origen)
 
         except Exception as e:
-            self.logger.exception(f"Error al insertar contenido de '{doc_origen_path}' en '{doc_destino_path}': {e}")
+            self.logger.exception(f"Error al insertar la sección '{titulo_origen}': {e}")
+            self.errors.append(str(e))
 
 
-    def _insert_text_and_images(self, content, doc_destino, paragraph):
-        """Inserta texto e imágenes después de un párrafo específico."""
+    def _insert_text_and_images(self, content, doc_destino, paragraph, after=None):
+        """Inserta texto e imágenes después de un párrafo específico (o del elemento `after`) y devuelve el último elemento insertado."""
+        # Obtener el elemento XML del párrafo actual
+        current_element = after if after is not None else paragraph._element
         try:
-            # Obtener el elemento XML del párrafo actual
-            current_element = paragraph._element
-
-            for element in content:
-                if element["type"] == "text":
-                    # Crear un nuevo párrafo después del párrafo actual
-                    new_para = doc_destino.add_paragraph()
-                    self.exporter._add_formatted_text(new_para, element["content"])
+            # Con el XML de la sección solo se rehace su título: párrafos y tablas se copian después en bloque
+            section_xml = getattr(content, "xml", None)
 
-                    # Mover el nuevo párrafo después del párrafo actual en el XML
-                    current_element.addnext(new_para._element)
-                    current_element = new_para._element  # Actualizar la referencia
+            for element in (content[:1] if section_xml is not None else content):
+                # Crear el nuevo párrafo directamente después del elemento actual
+                new_p = OxmlElement("w:p")
+                current_element.addnext(new_p)
+                new_para = Paragraph(new_p, doc_destino._body)
 
-                elif element["type"] == "image":
-                    # Crear un párrafo para la imagen
-                    new_para = doc_destino.add_paragraph()
-                    self.exporter._add_image_to_document(new_para, element["content"])
+                if element.type == "text":
+                    self.exporter._add_formatted_text(new_para, element.runs)
+                elif element.type == "image":
+                    self.exporter._add_image_to_document(new_para, element)
+                current_element = new_p  # Actualizar la referencia
 
-                    # Mover el párrafo de la imagen después del párrafo actual
-                    current_element.addnext(new_para._element)
-                    current_element = new_para._element  # Actualizar la referencia
+            if section_xml is not None:
+                current_element = self.exporter._insert_xml(doc_destino, current_element, section_xml)
 
-            self.logger.info("Texto e imágenes insertados correctamente.")
+            self.logger.debug("Texto e imágenes insertados correctamente.")
 
         except Exception as e:
             self.logger.exception(f"Error al insertar texto e imágenes: {e}")
+            self.errors.append(str(e))
+
+        return current_element
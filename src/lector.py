@@ -0,0 +1,170 @@
+import posixpath
+import zipfile
+import logging
+from collections import namedtuple
+from lxml import etree
+from docx.oxml.ns import qn
+from indice import DetectorTOC, nombres_estilos
+from secciones import ImageRef
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_XML = "word/document.xml"
+STYLES_XML = "word/styles.xml"
+DOCUMENT_RELS = "word/_rels/document.xml.rels"
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_P, _R, _TBL, _SDT = qn("w:p"), qn("w:r"), qn("w:tbl"), qn("w:sdt")
+_BODY, _SDT_CONTENT, _HYPERLINK = qn("w:body"), qn("w:sdtContent"), qn("w:hyperlink")
+_T, _TAB, _PTAB, _BR, _CR, _NO_BREAK_HYPHEN = qn("w:t"), qn("w:tab"), qn("w:ptab"), qn("w:br"), qn("w:cr"), qn("w:noBreakHyphen")
+_FALSE_VALUES = ("0", "false", "off")
+
+# Registro ligero de un párrafo:
+#   style   nombre del estilo (como `paragraph.style.name`)
+#   text    texto del párrafo (como `paragraph.text`)
+#   runs    tupla de (texto, negrita, cursiva, subrayado) por cada `w:r` directo
+#   images  tupla de (r:embed, (cx, cy) o None) de la primera imagen de cada run con `w:drawing` (r:embed None si no tiene `a:blip`)
+#   toc     True si el párrafo pertenece a la tabla de contenido
+#   body    True si es un párrafo de primer nivel del cuerpo (los que devuelve `document.paragraphs`)
+ParagraphRecord = namedtuple("ParagraphRecord", "style text runs images toc body")
+
+
+def read_style_names(archive):
+    """Lee styles.xml una sola vez: devuelve id de estilo -> nombre y el nombre del estilo de párrafo por defecto."""
+    try:
+        root = etree.fromstring(archive.read(STYLES_XML))
+    except KeyError:
+        return {}, ""
+    return nombres_estilos(root)
+
+
+def _toggle(rPr, tag):
+    """Valor tri-estado de una propiedad de run (negrita, cursiva)."""
+    element = rPr.find(tag) if rPr is not None else None
+    if element is None:
+        return None
+    return element.get(qn("w:val"), "true").lower() not in _FALSE_VALUES
+
+
+def _underline(rPr):
+    """Subrayado: None si se hereda, False si es "none" y True en otro caso."""
+    element = rPr.find(qn("w:u")) if rPr is not None else None
+    if element is None:
+        return None
+    return element.get(qn("w:val")) != "none"
+
+
+def _run_text(r):
+    """Texto de un run con la misma traducción de tabuladores y saltos que python-docx."""
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == _T:
+            parts.append(child.text or "")
+        elif tag in (_TAB, _PTAB):
+            parts.append("\t")
+        elif tag == _CR:
+            parts.append("\n")
+        elif tag == _BR:
+            parts.append("\n" if child.get(qn("w:type"), "textWrapping") == "textWrapping" else "")
+        elif tag == _NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_record(p, style_names, default_name, detector, body):
+    """Convierte un elemento `w:p` en un `ParagraphRecord`."""
+    p_style = p.find(qn("w:pPr") + "/" + qn("w:pStyle"))
+    style = style_names.get(p_style.get(qn("w:val")) if p_style is not None else None, default_name)
+
+    runs = []
+    images = []
+    text_parts = []
+    for child in p:
+        if child.tag == _R:
+            rPr = child.find(qn("w:rPr"))
+            run_text = _run_text(child)
+            text_parts.append(run_text)
+            runs.append((run_text, _toggle(rPr, qn("w:b")), _toggle(rPr, qn("w:i")), _underline(rPr)))
+            if child.find(".//" + qn("w:drawing")) is not None:
+                blip = child.find(".//" + qn("a:blip"))
+                extent = child.find(".//" + qn("wp:extent"))
+                images.append((
+                    blip.get(qn("r:embed")) if blip is not None else None,
+                    (int(extent.get("cx")), int(extent.get("cy"))) if extent is not None else None,
+                ))
+        elif child.tag == _HYPERLINK:
+            text_parts.extend(_run_text(r) for r in child.iterchildren(_R))
+
+    toc = detector.es_indice(p, style, en_sdt=not body)
+    return ParagraphRecord(style, "".join(text_parts), tuple(runs), tuple(images), toc, body)
+
+
+def _release(element):
+    """Libera un elemento ya procesado y los hermanos anteriores para que el árbol no crezca."""
+    element.clear()
+    parent = element.getparent()
+    while element.getprevious() is not None:
+        del parent[0]
+
+
+def iter_paragraphs(file_path):
+    """
+    Recorre word/document.xml con `iterparse` y produce un `ParagraphRecord` por cada párrafo
+    de primer nivel del cuerpo o de un control de contenido de primer nivel (donde suele estar
+    el índice), liberando los elementos a medida que avanza.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        style_names, default_name = read_style_names(archive)
+        detector = DetectorTOC()
+
+        with archive.open(DOCUMENT_XML) as stream:
+            for _, element in etree.iterparse(stream, events=("end",), tag=(_P, _TBL, _SDT)):
+                parent = element.getparent()
+                if parent is None:
+                    continue
+
+                if parent.tag == _BODY:
+                    if element.tag == _P:
+                        yield _paragraph_record(element, style_names, default_name, detector, body=True)
+                    _release(element)
+                elif (element.tag == _P and parent.tag == _SDT_CONTENT
+                      and parent.getparent() is not None and parent.getparent().getparent() is not None
+                      and parent.getparent().getparent().tag == _BODY):
+                    # Párrafo dentro de un w:sdt de primer nivel: se libera junto con el w:sdt
+                    yield _paragraph_record(element, style_names, default_name, detector, body=False)
+
+
+class StreamedDocument:
+    """Documento leído en streaming: registros de párrafo y acceso diferido a las imágenes del paquete."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.paragraphs = []  # Párrafos de primer nivel, como `document.paragraphs`
+        self.toc = []  # Párrafos de la tabla de contenido
+        self._targets = None
+
+        for record in iter_paragraphs(file_path):
+            if record.body:
+                self.paragraphs.append(record)
+            if record.toc:
+                self.toc.append(record)
+
+    def _image_targets(self):
+        """Relaciones del documento principal: r:id -> nombre del miembro del zip."""
+        if self._targets is None:
+            self._targets = {}
+            with zipfile.ZipFile(self.file_path) as archive:
+                root = etree.fromstring(archive.read(DOCUMENT_RELS))
+            for rel in root.iter(f"{{{RELS_NS}}}Relationship"):
+                if rel.get("TargetMode") == "External":
+                    continue
+                target = rel.get("Target")
+                member = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("word", target))
+                self._targets[rel.get("Id")] = member
+        return self._targets
+
+    def image_ref(self, rId):
+        """Devuelve una `ImageRef` a la imagen referenciada por `rId` sin leer sus bytes (None si no existe)."""
+        member = self._image_targets().get(rId)
+        return ImageRef(self.file_path, member) if member is not None else None
@@ -1,30 +1,147 @@
 import os
+import atexit
+import queue
 import logging
+import logging.handlers
 from datetime import datetime
+from decouple import config
 
-def setup_logging():
+LOG_FILE_NAME = "ing_solicitudes.log"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None  # QueueListener activo en modo asíncrono
+_queue_handler = None  # QueueHandler del logger raíz que alimenta a `_listener`
+
+
+class _Formatter(logging.Formatter):
+    """Formato de LOG_FORMAT salvo para las líneas ya formateadas (de los logs de los workers), que se escriben tal cual."""
+
+    def format(self, record):
+        if getattr(record, "preformateado", False):
+            return record.getMessage()
+        return super().format(record)
+
+
+def setup_logging(log_file_path=None, asynchronous=None, rotate=True):
+    """
+    Configura el logging raíz y devuelve la ruta del archivo de log.
+
+    El nivel se lee de LOG_LEVEL. Con LOG_ASYNC (por defecto) los registros pasan por una cola y un
+    hilo (`QueueListener`) los escribe en disco, de modo que el proceso no espera a la E/S del log.
+    Sin ruta explícita se escribe en logs/ing_solicitudes.log, rotado al superar LOG_MAX_BYTES y
+    conservando LOG_BACKUP_COUNT copias.
+    """
+    global _listener, _queue_handler
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     log_dir = os.path.join(BASE_DIR, 'logs')
+    if log_file_path is not None:
+        log_dir = os.path.dirname(os.path.abspath(log_file_path))
     os.makedirs(log_dir, exist_ok=True)
-    
-    # Crear un archivo de log con un nombre �nico basado en la fecha y hora de inicio
-    log_file_path = os.path.join(log_dir, f"ing_solicitudes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+
+    level = logging.getLevelName(config("LOG_LEVEL", default="INFO").upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    if asynchronous is None:
+        asynchronous = config("LOG_ASYNC", default=True, cast=bool)
+
+    # Crear un archivo de log con un nombre �nico basado en la fecha y hora de inicio si no se rota
+    if log_file_path is None:
+        if rotate:
+            log_file_path = os.path.join(log_dir, LOG_FILE_NAME)
+        else:
+            log_file_path = os.path.join(log_dir, f"ing_solicitudes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
 
     # Configuraci�n del logging
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level)
+    formatter = _Formatter(LOG_FORMAT)
 
     # File handler para guardar los logs en un archivo
-    file_handler = logging.FileHandler(log_file_path)
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    if rotate:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file_path,
+            maxBytes=config("LOG_MAX_BYTES", default=10 * 1024 * 1024, cast=int),
+            backupCount=config("LOG_BACKUP_COUNT", default=5, cast=int),
+            encoding='utf-8',
+        )
+    else:
+        file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
+    file_handler.setLevel(level)
+    file_handler.setFormatter(formatter)
 
     # Stream handler para mostrar los logs en la consola
     stream_handler = logging.StreamHandler()
-    stream_handler.setLevel(logging.INFO)  # o DEBUG si prefieres m�s detalles en consola
-    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    stream_handler.setLevel(max(level, logging.INFO))  # o DEBUG si prefieres m�s detalles en consola
+    stream_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    if asynchronous:
+        stop_logging()
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        logger.addHandler(_queue_handler)
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(stream_handler)
 
     return log_file_path
+
+
+def stop_logging():
+    """
+    Vacía la cola del modo asíncrono, detiene su hilo y quita del logger raíz el handler que la
+    alimenta, para que no siga acumulando registros que ya nadie lee (se llama también al salir del proceso).
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def _file_handlers():
+    """Handlers de archivo activos, tanto los del logger raíz como los del QueueListener."""
+    handlers = list(logging.getLogger().handlers)
+    if _listener is not None:
+        handlers.extend(_listener.handlers)
+    return [h for h in handlers if isinstance(h, logging.FileHandler)]
+
+
+def fusionar_logs(log_file_path, rutas):
+    """
+    Añade al log principal el contenido de los logs de los procesos worker y los elimina. Las líneas
+    pasan por el handler del log como registros ya formateados, así que respetan su rotación.
+    """
+    destino = os.path.abspath(log_file_path)
+    handler = next((h for h in _file_handlers() if h.baseFilename == destino), None)
+
+    for ruta in sorted(rutas):
+        with open(ruta, 'r', encoding='utf-8', errors='replace') as origen:
+            if handler is not None:
+                cabecera = True
+                for linea in origen:
+                    if cabecera:
+                        handler.handle(_registro_preformateado(f"----- {os.path.basename(ruta)} -----"))
+                        cabecera = False
+                    handler.handle(_registro_preformateado(linea.rstrip("\n")))
+            else:
+                contenido = origen.read()
+                if contenido:
+                    with open(destino, 'a', encoding='utf-8') as salida:
+                        salida.write(f"----- {os.path.basename(ruta)} -----\n" + contenido)
+
+        os.remove(ruta)
+
+
+def _registro_preformateado(linea):
+    """Registro que `_Formatter` escribe tal cual: una línea ya formateada de otro log."""
+    return logging.makeLogRecord({"name": __name__, "levelno": logging.INFO, "levelname": "INFO", "msg": linea,
+                                  "preformateado": True})
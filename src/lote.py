@@ -0,0 +1,348 @@
+import os
+import glob
+import shutil
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from logging_config import setup_logging, fusionar_logs
+from procesar import DocumentProcessor
+from exportar import DocumentExporter, EXPORT_FORMAT
+from corpus import SectionCorpus, CORPUS_FORMATS, CORPUS_FILE, convert_to_parquet, parquet_path, parquet_disponible
+from insertar import ContentInserter
+from mapeo import cargar_mapeo
+from plantillas import firma_plantillas
+import metricas
+
+logger = logging.getLogger(__name__)
+
+
+def exportar_documento(file_path, keywords, output_dir, export_sections=True, streaming=False, corpus_path=None):
+    """
+    Carga un documento e identifica sus secciones; si `export_sections` es True las exporta a `output_dir`
+    como .docx y, con `corpus_path`, las añade al corpus JSONL de esa ruta.
+
+    Devuelve (resultado, secciones). Las métricas de las etapas quedan en `resultado["metricas"]`.
+    """
+    metricas.recoger()  # Descartar lo acumulado fuera de este documento
+    inicio = time.perf_counter()
+    resultado = {"archivo": file_path, "estado": "ok", "secciones": 0, "error": None, "titulos": [], "salidas": []}
+    sections = {}
+    try:
+        processor = DocumentProcessor(file_path, streaming=streaming)
+        processor.load_document()
+        processor.identify_sections(keywords)
+
+        sections = processor.get_sections()
+        processor.release_document()  # Las secciones no dependen del documento de origen
+        resultado["secciones"] = len(sections)
+        resultado["titulos"] = list(sections)
+        if sections and (export_sections or corpus_path):
+            exporter = DocumentExporter(sections, output_dir, source_file=file_path, pages=processor.section_pages,
+                                        corpus_path=corpus_path)
+            if export_sections:
+                exporter.export_all_sections(export_format="docx")
+            if corpus_path:
+                exporter.export_all_sections(export_format="jsonl")
+            resultado["salidas"].extend(exporter.exported_files)
+    except Exception as e:
+        logger.exception(f"Error al procesar el documento '{file_path}': {e}")
+        resultado["estado"] = "error"
+        resultado["error"] = str(e)
+
+    resultado["tiempo_exportacion"] = time.perf_counter() - inicio
+    resultado["metricas"] = metricas.recoger()
+    return resultado, sections
+
+
+def exportar_en_worker(file_path, keywords, staging_dir, streaming, export_sections=True, export_format=EXPORT_FORMAT):
+    """
+    Variante para el pool: exporta en `staging_dir` (los .docx por sección o, con un formato de
+    corpus, su propio corpus JSONL) y devuelve (resultado, secciones). Las secciones viajan al
+    proceso principal por pickle, con su XML serializado, para insertarlas igual que en modo secuencial.
+    """
+    corpus_path = None
+    if export_sections and export_format in CORPUS_FORMATS:
+        corpus_path = os.path.join(staging_dir, CORPUS_FILE)
+        export_sections = False
+    return exportar_documento(file_path, keywords, staging_dir, export_sections=export_sections, streaming=streaming,
+                              corpus_path=corpus_path)
+
+
+def insertar_secciones(resultado, sections, output_dir, map_file_path, proyecto_menor):
+    """Inserta en las plantillas las secciones recibidas en memoria."""
+    metricas.recoger()
+    inicio = time.perf_counter()
+    exporter = DocumentExporter(sections, output_dir)
+    inserter = ContentInserter(input_dir=output_dir, config_dir="config", exporter=exporter)
+    inserter.process_sections(sections, mapping_file=map_file_path, proyecto_menor=proyecto_menor)
+    resultado["salidas"].extend(inserter.written_templates)
+    if inserter.errors:
+        resultado["estado"] = "error"
+        resultado["error"] = f"Error al insertar en las plantillas: {inserter.errors[0]}"
+        resultado["errores_insercion"] = len(inserter.errors)
+    resultado["tiempo_insercion"] = time.perf_counter() - inicio
+    resultado["metricas"] = metricas.combinar(resultado.get("metricas"), metricas.recoger())
+    return resultado
+
+
+def procesar_documento(file_path, keywords, output_dir, map_file_path, proyecto_menor, export_sections=True, streaming=False,
+                       corpus_path=None):
+    """
+    Procesa una entrada completa en el proceso actual: identificación, exportación e inserción.
+    Con un `EXPORT_FORMAT` de corpus las secciones se añaden a `corpus_path` (por defecto
+    `secciones.jsonl` en `output_dir`) en lugar de escribirse como .docx.
+    """
+    if export_sections and EXPORT_FORMAT in CORPUS_FORMATS:
+        corpus_path = corpus_path or os.path.join(output_dir, CORPUS_FILE)
+        export_sections = False
+    else:
+        corpus_path = None
+    resultado, sections = exportar_documento(file_path, keywords, output_dir, export_sections, streaming, corpus_path)
+    resultado["proyecto_menor"] = proyecto_menor
+    if resultado["estado"] == "ok":
+        insertar_secciones(resultado, sections, output_dir, map_file_path, proyecto_menor)
+    return resultado
+
+
+def resultado_error(file_path, error):
+    """Resultado de una entrada cuyo proceso worker falló."""
+    return {"archivo": file_path, "estado": "error", "secciones": 0, "error": str(error),
+            "titulos": [], "salidas": [], "tiempo_exportacion": 0.0}
+
+
+def completar_documento(resultado, sections, staging_dir, output_dir, map_file_path, proyecto_menor, export_sections=True,
+                        corpus_path=None):
+    """
+    Termina en el proceso principal una entrada exportada por un worker en `staging_dir`: inserta
+    en las plantillas las secciones que devolvió y mueve (o descarta) los archivos por sección. Si
+    el worker escribió un corpus, sus secciones se añaden a `corpus_path` (por defecto
+    `secciones.jsonl` en `output_dir`).
+    """
+    resultado["proyecto_menor"] = proyecto_menor
+    # Lo exportado se conserva aunque después falle la inserción en alguna plantilla
+    mover_secciones = export_sections and resultado["estado"] == "ok"
+    if resultado["estado"] == "ok":
+        insertar_secciones(resultado, sections, output_dir, map_file_path, proyecto_menor)
+
+    movidos = []
+    staged_corpus = os.path.join(staging_dir, CORPUS_FILE)
+    if os.path.exists(staged_corpus) and mover_secciones:
+        corpus_path = corpus_path or os.path.join(output_dir, CORPUS_FILE)
+        SectionCorpus(corpus_path).merge(staged_corpus)
+        movidos.append(corpus_path)
+
+    # Las rutas de las secciones pasan de la carpeta temporal a `output_dir`
+    movidos += _mover_exportados(staging_dir, output_dir, mover_secciones)
+    resultado["salidas"] = movidos + [s for s in resultado["salidas"] if not s.startswith(staging_dir)]
+    return resultado
+
+
+def inicializar_worker(log_file_path):
+    """
+    Configura en cada proceso worker su propio archivo de log, sin cola ni rotación: los workers
+    terminan sin ejecutar `atexit` y el archivo se fusiona entero con el log principal.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+    if log_file_path:
+        base, _ = os.path.splitext(log_file_path)
+        setup_logging(log_file_path=f"{base}_worker{os.getpid()}.log", asynchronous=False, rotate=False)
+
+
+def _mover_exportados(staging_dir, output_dir, export_sections):
+    """
+    Mueve a `output_dir` las secciones exportadas por un worker (o las descarta si no se piden los
+    archivos por sección) y devuelve las rutas finales.
+    """
+    movidos = []
+    if export_sections:
+        for nombre in sorted(os.listdir(staging_dir)):
+            destino = os.path.join(output_dir, nombre)
+            os.replace(os.path.join(staging_dir, nombre), destino)
+            movidos.append(destino)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return movidos
+
+
+def _cerrar_corpus(corpus_path, export_format):
+    """Convierte a Parquet el corpus del lote si se pidió ese formato."""
+    if export_format == "parquet" and corpus_path and os.path.exists(corpus_path):
+        try:
+            convert_to_parquet(corpus_path)
+        except Exception as e:
+            logger.exception(f"Error al convertir el corpus '{corpus_path}' a Parquet: {e}")
+
+
+def _registrar_tiempos(resultados):
+    """Registra en el log los tiempos por archivo del lote."""
+    for resultado in resultados:
+        logger.info(
+            f"{resultado['archivo']}: {resultado['estado']}, {resultado['secciones']} secciones, "
+            f"exportación {resultado.get('tiempo_exportacion', 0.0):.2f}s, "
+            f"inserción {resultado.get('tiempo_insercion', 0.0):.2f}s"
+        )
+
+
+def _entradas_pisadas(resultados, escritas):
+    """
+    Posiciones, en orden, de las entradas que hay que volver a procesar para que cada .docx escrito
+    en el lote (`escritas`: ruta -> última posición que lo escribió) quede como lo deja la última
+    entrada que lo genera. Al reprocesarlas se reescriben también sus demás salidas, así que se
+    añaden las entradas posteriores que comparten alguna de ellas.
+    """
+    ultima = {}
+    for posicion, resultado in enumerate(resultados):
+        if resultado["estado"] in ("ok", "cache"):
+            for salida in resultado["salidas"]:
+                if salida.endswith(".docx"):
+                    ultima[salida] = posicion
+
+    pendientes = {ultima[salida] for salida, posicion in escritas.items() if ultima.get(salida, posicion) != posicion}
+    pisadas = set()
+    while pendientes:
+        posicion = pendientes.pop()
+        if posicion in pisadas:
+            continue
+        pisadas.add(posicion)
+        pendientes.update(ultima[s] for s in resultados[posicion]["salidas"] if ultima.get(s, posicion) > posicion)
+    return sorted(pisadas)
+
+
+def _guardar_en_cache(cache, resultados, claves, escritas):
+    """
+    Registra en la caché las entradas procesadas y, con el hash final de sus salidas, las omitidas
+    cuyas salidas se reescribieron en el lote.
+    """
+    for posicion, resultado in enumerate(resultados):
+        if claves[posicion] is None:
+            continue
+        reescrita = resultado["estado"] == "cache" and any(s in escritas for s in resultado["salidas"])
+        if resultado["estado"] == "ok" or reescrita:
+            cache.put(claves[posicion], resultado["archivo"], resultado["titulos"], resultado["salidas"])
+
+
+def procesar_lote(entradas, keywords, output_dir, map_file_path, workers=1, log_file_path=None, export_sections=True,
+                  streaming=False, cache=None):
+    """
+    Procesa una lista de entradas (ruta, proyecto_menor) y devuelve un resultado por archivo.
+
+    Las secciones de cada entrada se insertan en las plantillas directamente desde memoria; con
+    `export_sections` se escribe además un .docx por sección en `output_dir`. Con `streaming` los
+    documentos se leen con el lector ligero de `lector.py` en lugar de python-docx.
+    La carga, identificación y exportación de secciones se reparten en un pool de procesos.
+    La inserción en plantillas se hace en el proceso principal en el orden de `entradas`, de
+    modo que las plantillas en las que escriben varias entradas quedan igual que en modo secuencial.
+    Con una `ProcessingCache` se saltan las entradas que no han cambiado desde la última ejecución;
+    si una entrada reprocesada sobrescribe una plantilla o sección que genera también otra posterior
+    omitida, esta se vuelve a procesar para que la salida quede igual que sin caché.
+    Con `EXPORT_FORMAT` "jsonl" o "parquet" las secciones de todo el lote se escriben en un único
+    corpus `secciones_<fecha>.jsonl` (convertido a .parquet al terminar) en lugar de un .docx por
+    sección; en ese caso no se usa la caché, para que el corpus contenga todas las entradas.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    resultados = [None] * len(entradas)
+
+    export_format = EXPORT_FORMAT if export_sections else "docx"
+    if export_format == "parquet" and not parquet_disponible():
+        logger.warning("pyarrow no está instalado: el corpus de secciones se escribirá en JSONL.")
+        export_format = "jsonl"
+    corpus_path = None
+    corpus_final = None
+    if export_format in CORPUS_FORMATS:
+        corpus_path = os.path.join(output_dir, f"secciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        corpus_final = parquet_path(corpus_path) if export_format == "parquet" else corpus_path
+        if cache is not None:
+            # Las entradas omitidas no llegarían al corpus de este lote, que quedaría incompleto
+            logger.info("Con EXPORT_FORMAT=%s no se usa la caché: el corpus debe incluir todas las entradas.", export_format)
+            cache = None
+
+    # Descartar las entradas sin cambios: mismo documento, keywords, mapeo, plantillas y opciones
+    pendientes = []
+    claves = [None] * len(entradas)
+    firmas = {}  # proyecto_menor -> firma de las plantillas que puede rellenar
+    for posicion, (file_path, proyecto_menor) in enumerate(entradas):
+        if cache is not None:
+            if proyecto_menor not in firmas:
+                firmas[proyecto_menor] = firma_plantillas(cargar_mapeo(map_file_path), proyecto_menor)
+            claves[posicion] = cache.key(file_path, keywords, map_file_path, proyecto_menor, export_sections, export_format,
+                                         streaming, firmas[proyecto_menor])
+            en_cache = cache.get(claves[posicion])
+            if en_cache is not None:
+                logger.info(f"Sin cambios desde la última ejecución, se omite: {file_path}")
+                resultados[posicion] = {
+                    "archivo": file_path, "estado": "cache", "secciones": len(en_cache["secciones"]), "error": None,
+                    "titulos": en_cache["secciones"], "salidas": en_cache["salidas"], "proyecto_menor": proyecto_menor,
+                }
+                continue
+        pendientes.append((posicion, file_path, proyecto_menor))
+
+    escritas = {}  # .docx escritos en este lote -> posición de la última entrada que lo escribió
+
+    def _registrar(posicion, resultado):
+        if corpus_final != corpus_path:
+            # Las salidas apuntan ya al corpus en Parquet, que se genera al terminar el lote
+            resultado["salidas"] = [corpus_final if s == corpus_path else s for s in resultado["salidas"]]
+        resultados[posicion] = resultado
+        if resultado["estado"] == "ok":
+            escritas.update((salida, posicion) for salida in resultado["salidas"] if salida.endswith(".docx"))
+
+    if workers <= 1 or len(pendientes) <= 1:
+        for posicion, file_path, proyecto_menor in pendientes:
+            resultado = procesar_documento(file_path, keywords, output_dir, map_file_path, proyecto_menor,
+                                           export_sections, streaming, corpus_path)
+            _registrar(posicion, resultado)
+    else:
+        staging_root = os.path.join(output_dir, ".lote")
+        os.makedirs(staging_root, exist_ok=True)
+        logger.info(f"Procesando {len(pendientes)} documentos con {workers} procesos.")
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=inicializar_worker, initargs=(log_file_path,)) as pool:
+                futuros = []
+                for posicion, file_path, proyecto_menor in pendientes:
+                    staging_dir = os.path.join(staging_root, f"{posicion:04d}")
+                    os.makedirs(staging_dir, exist_ok=True)
+                    futuro = pool.submit(exportar_en_worker, file_path, keywords, staging_dir, streaming, export_sections,
+                                         export_format)
+                    futuros.append((futuro, posicion, file_path, staging_dir, proyecto_menor))
+
+                # Consumir en el orden de entrada: la inserción de una entrada se solapa con la exportación de las siguientes
+                for futuro, posicion, file_path, staging_dir, proyecto_menor in futuros:
+                    try:
+                        resultado, sections = futuro.result()
+                    except Exception as e:
+                        logger.exception(f"Error en el proceso worker: {e}")
+                        resultado, sections = resultado_error(file_path, e), {}
+
+                    completar_documento(resultado, sections, staging_dir, output_dir, map_file_path, proyecto_menor,
+                                        export_sections, corpus_path)
+                    _registrar(posicion, resultado)
+        finally:
+            shutil.rmtree(staging_root, ignore_errors=True)
+            if log_file_path:
+                base, _ = os.path.splitext(log_file_path)
+                fusionar_logs(log_file_path, glob.glob(f"{glob.escape(base)}_worker*.log"))
+
+    # Una plantilla (o una sección con el mismo título) que escriben varias entradas debe quedar como la
+    # deja la última de ellas, igual que sin caché: se vuelven a insertar las omitidas que quedaron pisadas
+    for posicion in _entradas_pisadas(resultados, escritas):
+        file_path, proyecto_menor = entradas[posicion]
+        logger.info(f"Otra entrada del lote sobrescribió sus salidas, se vuelve a procesar: {file_path}")
+        anteriores = resultados[posicion]["salidas"]
+        resultado = procesar_documento(file_path, keywords, output_dir, map_file_path, proyecto_menor,
+                                       export_sections and corpus_path is None, streaming)
+        resultado["salidas"] += [s for s in anteriores if s not in resultado["salidas"]]
+        _registrar(posicion, resultado)
+
+    _cerrar_corpus(corpus_path, export_format)
+    if cache is not None:
+        if any(resultado.get("errores_insercion") for resultado in resultados):
+            # Una plantilla compartida puede haber quedado a medias: no se da por buena ninguna salida del lote
+            logger.warning("Hubo errores al insertar en las plantillas; no se actualiza la caché.")
+        else:
+            _guardar_en_cache(cache, resultados, claves, escritas)
+    _registrar_tiempos(resultados)
+    return resultados
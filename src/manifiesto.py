@@ -0,0 +1,84 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _leer_archivo(ruta):
+    """Lee el manifiesto como JSON o, si la extensión es .yaml/.yml, como YAML."""
+    with open(ruta, 'r', encoding='utf-8') as file:
+        if os.path.splitext(ruta)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Se necesita PyYAML para leer manifiestos YAML (pip install pyyaml).")
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+def leer_proyecto_menor(valor, origen="proyecto_menor"):
+    """
+    Interpreta `proyecto_menor`: un bool o las cadenas "s"/"n" o "true"/"false" (sin distinguir
+    mayúsculas). Cualquier otro valor es un error, para no tomar p. ej. "false" como verdadero.
+    """
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.strip().lower() in ("s", "true"):
+        return True
+    if isinstance(valor, str) and valor.strip().lower() in ("n", "false"):
+        return False
+    raise ValueError(f"Valor no válido para {origen}: {valor!r} (se admite true/false o s/n).")
+
+
+def cargar_manifiesto(ruta, input_dir):
+    """
+    Carga un manifiesto de trabajo con las solicitudes a procesar.
+
+    Formato (JSON o YAML):
+        {
+            "cliente": "/ruta/a/la/carpeta/del/cliente",
+            "workers": 4,                      # opcional
+            "proyecto_menor": false,           # opcional, valor por defecto para las entradas (true/false o "s"/"n")
+            "entradas": [
+                "solicitud_a.docx",
+                {"archivo": "solicitud_b.docx", "proyecto_menor": true}
+            ]
+        }
+
+    Las rutas relativas de las entradas se resuelven contra `input_dir`.
+    Devuelve un dict con `cliente`, `workers` y `entradas` como lista de (ruta, proyecto_menor).
+    """
+    datos = _leer_archivo(ruta)
+    if not isinstance(datos, dict):
+        raise ValueError(f"El manifiesto '{ruta}' debe ser un objeto con la clave 'entradas'.")
+
+    entradas_raw = datos.get("entradas")
+    if not isinstance(entradas_raw, list) or not entradas_raw:
+        raise ValueError(f"El manifiesto '{ruta}' no contiene una lista 'entradas' con archivos.")
+
+    proyecto_menor_defecto = leer_proyecto_menor(datos.get("proyecto_menor", False), f"'proyecto_menor' del manifiesto '{ruta}'")
+    entradas = []
+    for posicion, entrada in enumerate(entradas_raw):
+        if isinstance(entrada, str):
+            entrada = {"archivo": entrada}
+        if not isinstance(entrada, dict) or not entrada.get("archivo"):
+            raise ValueError(f"Entrada {posicion} del manifiesto sin 'archivo': {entrada!r}")
+
+        file_path = os.path.join(input_dir, entrada["archivo"])
+        if not os.path.isfile(file_path):
+            raise ValueError(f"Entrada {posicion} del manifiesto: no existe el archivo '{file_path}'.")
+
+        proyecto_menor = entrada.get("proyecto_menor", proyecto_menor_defecto)
+        entradas.append((file_path, leer_proyecto_menor(proyecto_menor, f"'proyecto_menor' de la entrada {posicion} del manifiesto")))
+
+    workers = datos.get("workers")
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        raise ValueError(f"El valor de 'workers' del manifiesto debe ser un entero positivo: {workers!r}")
+
+    logger.info(f"Manifiesto cargado: {ruta} ({len(entradas)} entradas)")
+    return {
+        "cliente": (datos.get("cliente") or "").strip(),
+        "workers": workers,
+        "entradas": entradas,
+    }
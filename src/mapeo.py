@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache.json"
+
+# Mapeos ya cargados en este proceso: ruta absoluta -> ((mtime_ns, tamaño), mapeo)
+_mapeos = {}
+# Hashes ya calculados en este proceso: ruta absoluta -> ((mtime_ns, tamaño), sha256)
+_hashes = {}
+
+
+def hash_archivo(ruta, chunk_size=1024 * 1024):
+    """Calcula el SHA-256 del contenido de un archivo."""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_memorizado(ruta, memo=None):
+    """
+    SHA-256 de un archivo que solo se recalcula si cambian su fecha de modificación o su tamaño.
+    `memo` es la tabla ruta absoluta -> ((mtime_ns, tamaño), sha256) donde se consulta y guarda
+    (cualquier objeto con `get` y asignación por clave); por defecto, la del proceso.
+    """
+    memo = _hashes if memo is None else memo
+    ruta = os.path.abspath(ruta)
+    stat = os.stat(ruta)
+    firma = (stat.st_mtime_ns, stat.st_size)
+    conocido = memo.get(ruta)
+    if conocido and tuple(conocido[0]) == firma:
+        return conocido[1]
+
+    sha256 = hash_archivo(ruta)
+    memo[ruta] = (firma, sha256)
+    return sha256
+
+
+def _valor(valor):
+    """Normaliza una celda del Excel: texto sin espacios sobrantes o None si está vacía."""
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _filas_excel(mapping_file):
+    """Recorre la primera hoja del Excel como diccionarios columna -> valor, usando la primera fila como cabecera."""
+    # openpyxl solo se importa si hay que leer el libro: con el sidecar al día no hace falta
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(mapping_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = {}
+        for position, name in enumerate(header):
+            if name is not None:
+                columns.setdefault(str(name), position)
+        for row in rows:
+            yield {name: row[position] if position < len(row) else None for name, position in columns.items()}
+    finally:
+        workbook.close()
+
+
+def _parsear_excel(mapping_file):
+    """Lee el Excel de mapeo y lo convierte en keyword -> {presentacion, memoria, ruta}."""
+    mapeo = {}
+    for row in _filas_excel(mapping_file):
+        keyword = _valor(row.get("keyword"))
+        if not keyword:
+            continue
+        # Si una keyword aparece en varias filas manda la primera
+        mapeo.setdefault(keyword, {
+            "presentacion": _valor(row.get("presentacion")),
+            "memoria": _valor(row.get("memoria")),
+            "ruta": _valor(row.get("ruta")),
+        })
+    return mapeo
+
+
+def _leer_sidecar(sidecar, stat, ruta):
+    """
+    Devuelve (mapeo, sha256, actualizar) a partir del sidecar.
+
+    `mapeo` es None si el sidecar no existe o ya no corresponde al Excel; `actualizar` indica
+    que el contenido coincide pero hay que refrescar la fecha guardada.
+    """
+    try:
+        with open(sidecar, 'r', encoding='utf-8') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None, None, False
+
+    if cache.get("version") != CACHE_VERSION:
+        return None, None, False
+
+    # Si la fecha cambió (copia, checkout...) se compara el contenido y hay que refrescar la fecha guardada
+    guardada = (cache.get("mtime_ns"), cache.get("size"))
+    sha256 = hash_memorizado(ruta, {ruta: (guardada, cache.get("sha256"))})
+    if sha256 != cache.get("sha256"):
+        return None, sha256, False
+    return cache.get("mapeo"), sha256, guardada != (stat.st_mtime_ns, stat.st_size)
+
+
+def _escribir_sidecar(sidecar, stat, sha256, mapeo):
+    """Guarda el mapeo junto al Excel. Si la carpeta no admite escritura se continúa sin caché en disco."""
+    cache = {
+        "version": CACHE_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": sha256,
+        "mapeo": mapeo,
+    }
+    try:
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(cache, file, ensure_ascii=False)
+        os.replace(tmp_path, sidecar)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar la caché del mapeo en '{sidecar}': {e}")
+
+
+def cargar_mapeo(mapping_file):
+    """
+    Devuelve el mapeo keyword -> {presentacion, memoria, ruta} del Excel.
+
+    Se parsea una sola vez por proceso y se guarda en un sidecar JSON junto al Excel, validado
+    por fecha/tamaño y, si estos cambian, por hash del contenido; así las ejecuciones siguientes
+    no necesitan volver a leer el libro de Excel.
+    """
+    ruta = os.path.abspath(mapping_file)
+    stat = os.stat(ruta)
+    firma = (stat.st_mtime_ns, stat.st_size)
+
+    en_memoria = _mapeos.get(ruta)
+    if en_memoria and en_memoria[0] == firma:
+        return en_memoria[1]
+
+    sidecar = ruta + CACHE_SUFFIX
+    mapeo, sha256, actualizar = _leer_sidecar(sidecar, stat, ruta)
+    if mapeo is not None:
+        logger.info(f"Mapeo cargado desde la caché: {sidecar}")
+        if actualizar:
+            _escribir_sidecar(sidecar, stat, sha256, mapeo)
+    else:
+        mapeo = _parsear_excel(ruta)
+        _escribir_sidecar(sidecar, stat, sha256 or hash_memorizado(ruta), mapeo)
+        logger.info(f"Mapeo leído del Excel: {ruta} ({len(mapeo)} keywords)")
+
+    _mapeos[ruta] = (firma, mapeo)
+    return mapeo
@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = "ing_solicitudes"
+
+
+class Metricas:
+    """
+    Acumulador de tiempos por etapa y contadores de una unidad de trabajo (normalmente un documento).
+
+    Cada proceso tiene su propio acumulador (`actual`); los workers devuelven su instantánea en
+    el diccionario de resultado y el proceso principal las suma con `combinar`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etapas = {}  # etapa -> [segundos, llamadas]
+        self.contadores = {}  # nombre -> valor
+
+
+    def registrar_tiempo(self, etapa, segundos):
+        with self._lock:
+            acumulado = self.etapas.setdefault(etapa, [0.0, 0])
+            acumulado[0] += segundos
+            acumulado[1] += 1
+
+
+    def contar(self, nombre, cantidad=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+
+    def recoger(self):
+        """Devuelve una instantánea serializable (JSON, pickle) y deja el acumulador vacío."""
+        with self._lock:
+            instantanea = {
+                "etapas": {etapa: {"segundos": round(segundos, 6), "llamadas": llamadas}
+                           for etapa, (segundos, llamadas) in sorted(self.etapas.items())},
+                "contadores": dict(sorted(self.contadores.items())),
+            }
+            self.etapas = {}
+            self.contadores = {}
+        return instantanea
+
+
+actual = Metricas()
+
+
+@contextmanager
+def medir(etapa):
+    """Mide la duración del bloque y la acumula en la etapa indicada."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        actual.registrar_tiempo(etapa, time.perf_counter() - inicio)
+
+
+def cronometrar(etapa):
+    """Decorador equivalente a `medir` para métodos completos."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(etapa):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def contar(nombre, cantidad=1):
+    """Suma `cantidad` al contador `nombre` del acumulador del proceso."""
+    actual.contar(nombre, cantidad)
+
+
+def recoger():
+    return actual.recoger()
+
+
+def combinar(*instantaneas):
+    """Suma varias instantáneas de `recoger` (las vacías o None se ignoran)."""
+    total = {"etapas": {}, "contadores": {}}
+    for instantanea in instantaneas:
+        if not instantanea:
+            continue
+        for etapa, valores in instantanea.get("etapas", {}).items():
+            acumulado = total["etapas"].setdefault(etapa, {"segundos": 0.0, "llamadas": 0})
+            acumulado["segundos"] = round(acumulado["segundos"] + valores["segundos"], 6)
+            acumulado["llamadas"] += valores["llamadas"]
+        for nombre, valor in instantanea.get("contadores", {}).items():
+            total["contadores"][nombre] = total["contadores"].get(nombre, 0) + valor
+    total["etapas"] = dict(sorted(total["etapas"].items()))
+    total["contadores"] = dict(sorted(total["contadores"].items()))
+    return total
+
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def escribir_prometheus(resumen, ruta):
+    """
+    Escribe el resumen de la ejecución en formato de texto de Prometheus para el textfile collector
+    de node_exporter. Se escribe en un temporal y se renombra para que el collector nunca lea un archivo a medias.
+    """
+    metricas = resumen.get("metricas", {})
+    lineas = [
+        f"# HELP {PROMETHEUS_PREFIX}_ultima_ejecucion_timestamp_seconds Fin de la última ejecución.",
+        f"# TYPE {PROMETHEUS_PREFIX}_ultima_ejecucion_timestamp_seconds gauge",
+        f"{PROMETHEUS_PREFIX}_ultima_ejecucion_timestamp_seconds {time.time():.0f}",
+        f"# HELP {PROMETHEUS_PREFIX}_ejecucion_segundos Duración total de la última ejecución.",
+        f"# TYPE {PROMETHEUS_PREFIX}_ejecucion_segundos gauge",
+        f"{PROMETHEUS_PREFIX}_ejecucion_segundos {resumen.get('duracion', 0.0):.6f}",
+        f"# HELP {PROMETHEUS_PREFIX}_documentos Documentos de la última ejecución por estado.",
+        f"# TYPE {PROMETHEUS_PREFIX}_documentos gauge",
+    ]
+    estados = {}
+    for archivo in resumen.get("archivos", []):
+        estados[archivo["estado"]] = estados.get(archivo["estado"], 0) + 1
+    for estado in ("ok", "cache", "error"):
+        lineas.append(f'{PROMETHEUS_PREFIX}_documentos{{estado="{estado}"}} {estados.get(estado, 0)}')
+
+    lineas += [
+        f"# HELP {PROMETHEUS_PREFIX}_etapa_segundos Tiempo acumulado por etapa en la última ejecución.",
+        f"# TYPE {PROMETHEUS_PREFIX}_etapa_segundos gauge",
+    ]
+    for etapa, valores in metricas.get("etapas", {}).items():
+        lineas.append(f'{PROMETHEUS_PREFIX}_etapa_segundos{{etapa="{_etiqueta(etapa)}"}} {valores["segundos"]:.6f}')
+    lineas += [
+        f"# HELP {PROMETHEUS_PREFIX}_etapa_llamadas Llamadas por etapa en la última ejecución.",
+        f"# TYPE {PROMETHEUS_PREFIX}_etapa_llamadas gauge",
+    ]
+    for etapa, valores in metricas.get("etapas", {}).items():
+        lineas.append(f'{PROMETHEUS_PREFIX}_etapa_llamadas{{etapa="{_etiqueta(etapa)}"}} {valores["llamadas"]}')
+
+    for nombre, valor in metricas.get("contadores", {}).items():
+        lineas += [
+            f"# TYPE {PROMETHEUS_PREFIX}_{nombre} gauge",
+            f"{PROMETHEUS_PREFIX}_{nombre} {valor}",
+        ]
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    temporal = os.path.join(directorio, f".{os.path.basename(ruta)}.{os.getpid()}.tmp")
+    with open(temporal, 'w', encoding='utf-8') as file:
+        file.write("\n".join(lineas) + "\n")
+    os.replace(temporal, ruta)
@@ -1,42 +1,121 @@
 import os
+import errno
 import shutil
 import logging
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from mapeo import cargar_mapeo
+from metricas import cronometrar, contar
+
+COPY_WORKERS = 8  # Copias simultáneas cuando el destino está en otro sistema de archivos
 
 class DocumentOrganizer:
-    def __init__(self, input_dir):
+    def __init__(self, input_dir, copy_workers=COPY_WORKERS):
         self.input_dir = input_dir
+        self.copy_workers = copy_workers
         self.logger = logging.getLogger(__name__)
 
+
+    def _target_folder(self, raw_path, cliente_base_path):
+        """Reemplaza 'cliente' en la ruta del mapeo con la ruta base del cliente y la normaliza."""
+        replaced_path = raw_path.replace("cliente\\", "")
+        return os.path.normpath(os.path.join(cliente_base_path, replaced_path)).replace("\\", "/")
+
+
+    def _index_files(self, keywords):
+        """
+        Lista la carpeta de entrada una sola vez y devuelve keyword -> archivos cuyo nombre la contiene.
+        Cada archivo se asigna a la primera keyword del mapeo que coincide, como cuando se movía al encontrarlo.
+        """
+        with os.scandir(self.input_dir) as entries:
+            filenames = sorted(entry.name for entry in entries if entry.is_file())
+
+        index = {keyword: [] for keyword in keywords}
+        lowered = [(keyword, keyword.lower()) for keyword in keywords]
+        for filename in filenames:
+            name = filename.lower()
+            keyword = next((keyword for keyword, low in lowered if low in name), None)
+            if keyword is not None:
+                index[keyword].append(filename)
+        return index
+
+
+    def _copy_and_remove(self, source, destination):
+        """Mueve entre sistemas de archivos: copia a un temporal en el destino, lo renombra y borra el origen."""
+        temporary = f"{destination}.tmp{os.getpid()}"
+        shutil.copy2(source, temporary)
+        os.replace(temporary, destination)
+        os.remove(source)
+        return destination
+
+
+    def _move_files(self, moves):
+        """Mueve con `os.replace`; los que fallan por estar en otro dispositivo se copian en paralelo."""
+        moved = []
+        cross_device = []
+        for source, destination in moves:
+            try:
+                os.replace(source, destination)
+                moved.append((source, destination))
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    self.logger.exception(f"Error al mover '{source}' a '{destination}': {e}")
+                    continue
+                cross_device.append((source, destination))
+
+        if cross_device:
+            self.logger.info("Copiando %d documentos a otro sistema de archivos.", len(cross_device))
+            with ThreadPoolExecutor(max_workers=self.copy_workers) as pool:
+                futures = [(pool.submit(self._copy_and_remove, source, destination), source, destination)
+                           for source, destination in cross_device]
+                for future, source, destination in futures:
+                    try:
+                        future.result()
+                        moved.append((source, destination))
+                    except OSError as e:
+                        self.logger.exception(f"Error al copiar '{source}' a '{destination}': {e}")
+
+        return moved
+
+
+    @cronometrar("organizar.organize_documents")
     def organize_documents(self, mapping_file, cliente_base_path):
-        """Organiza documentos en carpetas basadas en el mapeo del archivo Excel. Reemplaza 'cliente' en la ruta con la ruta base proporcionada por el usuario."""
+        """
+        Organiza documentos en carpetas basadas en el mapeo del archivo Excel. Reemplaza 'cliente' en la ruta con la ruta base proporcionada por el usuario.
+        Devuelve la lista de (origen, destino) movidos.
+        """
         try:
-            # Leer el mapeo desde el archivo Excel
-            mapping = pd.read_excel(mapping_file)
+            # Leer el mapeo desde el archivo Excel (o su caché)
+            mapping = cargar_mapeo(mapping_file)
+            index = self._index_files(list(mapping))
 
-            for _, row in mapping.iterrows():
-                keyword = row['keyword']
+            moves = []
+            folders = set()
+            for keyword, row in mapping.items():
                 raw_path = row['ruta']
+                if not raw_path:
+                    self.logger.warning(f"No se especificó una ruta para la keyword: {keyword}")
+                    continue
 
-                # Reemplazar 'cliente' en la ruta con la ruta base del cliente proporcionada
-                replaced_path = raw_path.replace("cliente\\", "")
-                target_folder = os.path.normpath(os.path.join(cliente_base_path, replaced_path)).replace("\\","/")  # Normalizar ruta final
-                # Crear la carpeta de destino completa si no existe
-                os.makedirs(target_folder, exist_ok=True)
-
-                # Buscar el archivo en la carpeta de entrada
-                moved = False
-                for filename in os.listdir(self.input_dir):
-                    if keyword.lower() in filename.lower():
-                        file_path = os.path.join(self.input_dir, filename)
-                        # Mover el archivo al destino final
-                        shutil.move(file_path, os.path.join(target_folder, filename))
-                        self.logger.info(f"Documento movido: {filename} -> {target_folder}")
-                        moved = True
-                        break
-
-                if not moved:
+                filenames = index.get(keyword)
+                if not filenames:
                     self.logger.warning(f"No se encontró un archivo para la keyword: {keyword}")
+                    continue
+
+                target_folder = self._target_folder(raw_path, cliente_base_path)
+                folders.add(target_folder)
+                for filename in filenames:
+                    moves.append((os.path.join(self.input_dir, filename), os.path.join(target_folder, filename)))
+
+            # Crear las carpetas de destino una sola vez
+            for folder in sorted(folders):
+                os.makedirs(folder, exist_ok=True)
+
+            moved = self._move_files(moves)
+            for source, destination in moved:
+                self.logger.info("Documento movido: %s -> %s", os.path.basename(source), os.path.dirname(destination))
+            contar("documentos_movidos", len(moved))
+            return moved
 
         except Exception as e:
             self.logger.exception(f"Error organizando documentos: {e}")
+            return []
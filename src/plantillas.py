@@ -0,0 +1,114 @@
+import os
+import copy
+import glob
+import hashlib
+import logging
+from docx import Document
+from indice import normalizar
+from lector import iter_paragraphs
+from mapeo import hash_memorizado
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FOLDERS = ("memorias", "presentaciones")
+
+# Índices de títulos ya construidos: sha256 de la plantilla -> índice
+_indices = {}
+# Plantillas ya leídas: sha256 de la plantilla -> Document del que se entrega una copia en cada uso
+_documentos = {}
+
+
+def firma_plantillas(mapeo, proyecto_menor, config_dir="config"):
+    """
+    Hash conjunto de las plantillas a las que remite el mapeo para el tipo de proyecto: cambia si
+    se edita cualquiera de ellas o si aparece o desaparece alguna.
+    """
+    columna, carpeta = ("presentacion", "presentaciones") if proyecto_menor else ("memoria", "memorias")
+    partes = []
+    for nombre in sorted({fila[columna] for fila in mapeo.values() if fila.get(columna)}):
+        ruta = os.path.abspath(os.path.join(config_dir, carpeta, nombre))
+        partes.append(f"{nombre}={hash_memorizado(ruta) if os.path.isfile(ruta) else '-'}")
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def _construir_indice(ruta):
+    """Recorre la plantilla una vez y anota los títulos ARTICA con su posición entre los párrafos del cuerpo."""
+    titulos = []  # (texto normalizado, posición, texto original)
+    parrafos = 0
+    for record in iter_paragraphs(ruta):
+        if not record.body:
+            continue
+        if record.style.startswith("ARTICA"):
+            titulos.append((normalizar(record.text), parrafos, record.text))
+        parrafos += 1
+    return {"titulos": titulos, "parrafos": parrafos, "busquedas": {}}
+
+
+def indice_plantilla(template_path):
+    """
+    Devuelve el índice de títulos de una plantilla: {titulos: [(normalizado, posición, texto)],
+    parrafos, busquedas}. Se construye una sola vez por contenido (hash) y se reutiliza mientras
+    la plantilla no cambie.
+    """
+    ruta = os.path.abspath(template_path)
+    sha256 = hash_memorizado(ruta)
+    indice = _indices.get(sha256)
+    if indice is None:
+        indice = _construir_indice(ruta)
+        _indices[sha256] = indice
+        logger.debug("Índice de títulos de %s: %d títulos en %d párrafos.", ruta, len(indice["titulos"]), indice["parrafos"])
+    return indice
+
+
+def _documento_plantilla(ruta):
+    """Document de la plantilla, leído y analizado una sola vez por contenido (hash)."""
+    sha256 = hash_memorizado(ruta)
+    documento = _documentos.get(sha256)
+    if documento is None:
+        documento = Document(ruta)
+        _documentos[sha256] = documento
+    return documento
+
+
+def abrir_plantilla(template_path):
+    """
+    Devuelve una copia profunda del documento de la plantilla para rellenarla sin tocar la que
+    se mantiene en memoria: solo la primera vez se lee del disco.
+    """
+    return copy.deepcopy(_documento_plantilla(os.path.abspath(template_path)))
+
+
+def buscar_titulo(indice, titulo):
+    """
+    Devuelve (posición, texto) del primer título ARTICA de la plantilla que contiene `titulo`
+    (sin distinguir mayúsculas ni acentos), o None. El resultado se memoriza por título.
+    """
+    busquedas = indice["busquedas"]
+    if titulo not in busquedas:
+        buscado = normalizar(titulo)
+        busquedas[titulo] = next(
+            ((posicion, texto) for normalizado, posicion, texto in indice["titulos"] if buscado in normalizado),
+            None,
+        )
+    return busquedas[titulo]
+
+
+def precargar_plantillas(config_dir, documentos=False):
+    """
+    Construye al arrancar los índices de todas las plantillas de `config_dir` (y, con `documentos`,
+    las deja también leídas en memoria) y devuelve cuántas hay.
+    """
+    total = 0
+    for carpeta in TEMPLATE_FOLDERS:
+        for ruta in sorted(glob.glob(os.path.join(glob.escape(config_dir), carpeta, "*.docx"))):
+            if os.path.basename(ruta).startswith("~$"):
+                continue
+            try:
+                indice_plantilla(ruta)
+                if documentos:
+                    _documento_plantilla(os.path.abspath(ruta))
+                total += 1
+            except Exception as e:
+                logger.exception(f"Error al indexar la plantilla '{ruta}': {e}")
+    logger.info("Índices de títulos precalculados para %d plantillas%s.", total, " (documentos en memoria)" if documentos else "")
+    return total
@@ -1,32 +1,71 @@
 from docx import Document
+from docx.text.paragraph import Paragraph
+from docx.oxml.ns import qn
 import re
+import hashlib
 import logging
-from logging_config import setup_logging
+from indice import crear_matcher, nombres_estilos, DetectorTOC, MATCHER_AHO_CORASICK
+from lector import StreamedDocument
+from metricas import cronometrar, contar
+from secciones import TextBlock, ImageBlock, Section, heading_block
+from clonado import body_elements, capture_section_xml
 
 class DocumentProcessor:
-    def __init__(self, file_path):
+    def __init__(self, file_path, keyword_matcher=MATCHER_AHO_CORASICK, streaming=False):
         self.logger = logging.getLogger(__name__)
         self.file_path = file_path
+        self.keyword_matcher = keyword_matcher  # "aho-corasick" o "regex"
+        self.streaming = streaming  # Leer con el lector en streaming (lxml.iterparse) en lugar de python-docx
         self.document = None
         self.sections = {}
+        self.section_pages = {}  # título -> página indicada en el índice
+        self._section_index = None
+        self._image_digests = {}  # imagen de origen -> hash del contenido, para no recalcularlo en imágenes repetidas
 
 
+    @cronometrar("procesar.load_document")
     def load_document(self):
         """Carga el documento Word y lo prepara para el procesamiento."""
         try:
-            self.document = Document(self.file_path)
+            self.document = StreamedDocument(self.file_path) if self.streaming else Document(self.file_path)
+            self._section_index = None
             self.logger.info("Documento cargado con éxito.")
         except Exception as e:
             self.logger.exception(f"Error al cargar el documento: {e}")
             raise
 
 
-    def extract_index_titles(self, keywords):
+    def _style_names(self):
+        """Devuelve el diccionario id de estilo -> nombre y el nombre del estilo de párrafo por defecto."""
+        return nombres_estilos(self.document.styles.element)
+
+
+    def _toc_paragraphs(self):
+        """Devuelve los párrafos del índice: estilo "TOC n", dentro de un campo TOC o de un bloque de tabla de contenido."""
+        if self.streaming:
+            # El lector en streaming ya marca los párrafos del índice al leerlos
+            return self.document.toc
+
+        style_names, default_name = self._style_names()
+        body = self.document.element.body
+        detector = DetectorTOC()
+        toc = []
+
+        # El índice suele estar dentro de un control de contenido (w:sdt), que `document.paragraphs` no recorre
+        for p in body.xpath("./w:p | ./w:sdt/w:sdtContent/w:p"):
+            if detector.es_indice(p, style_names.get(p.style, default_name)):
+                toc.append(Paragraph(p, self.document._body))
+
+        return toc
+
+
+    @cronometrar("procesar.extract_index_titles")
+    def extract_index_titles(self, keywords, matcher=None):
         """Busca títulos en el índice que contengan palabras clave y extrae el número de página."""
         try:
             index_titles = []
-            pattern = '|'.join(re.escape(keyword) for keyword in keywords)
-            regex = re.compile(pattern, re.IGNORECASE)
+            if matcher is None:
+                matcher = crear_matcher(keywords, self.keyword_matcher)
 
             # Patrón para detectar títulos en el índice
             index_pattern = re.compile(
@@ -35,108 +74,247 @@ class DocumentProcessor:
 
             self.logger.info("Analizando el índice para encontrar títulos relevantes...")
 
-            for para in self.document.paragraphs:
+            # Limitar la búsqueda a la tabla de contenido; si el documento no la marca, recorrer todo el cuerpo
+            paragraphs = self._toc_paragraphs()
+            if paragraphs:
+                self.logger.info(f"Tabla de contenido detectada: {len(paragraphs)} párrafos.")
+            else:
+                self.logger.info("No se detectó una tabla de contenido; se analiza todo el documento.")
+                paragraphs = self.document.paragraphs
+            contar("parrafos_indice", len(paragraphs))
+
+            for para in paragraphs:
                 text = para.text.strip()
 
                 match = index_pattern.match(text)
-                if match and regex.search(match.group("title")):
+                if match and matcher.search(match.group("title")):
                     title = match.group("title")
                     page = int(match.group("page"))
 
                     # Limpieza del título
                     clean_title = re.sub(r"^\d+(\.\d+)*\s*", "", title).strip()
                     clean_title = re.sub(r"^\.\s*", "", clean_title)  # Eliminar punto y tabulación iniciales
-                    self.logger.info(f"Título válido del índice encontrado: {text} -> Título limpio: {clean_title}, Página: {page}")
+                    self.logger.debug("Título válido del índice encontrado: %s -> Título limpio: %s, Página: %d", text, clean_title, page)
                     index_titles.append((clean_title, page))
 
-            self.logger.info(f"Títulos identificados en el índice: {index_titles}")
+            self.logger.info("Títulos identificados en el índice: %d", len(index_titles))
+            self.logger.debug("Títulos del índice: %s", index_titles)
             return index_titles
         except Exception as e:
             self.logger.exception(f"Error al analizar el índice: {e}")
             return []
 
 
-    def find_section_content(self, title):
-        """Busca el contenido de una sección basándose en su título y estilo."""
+    @cronometrar("procesar.build_section_index")
+    def build_section_index(self):
+        """Recorre el cuerpo una sola vez y registra los límites de cada título con estilo ARTICA."""
         try:
-            content = []
-            capturing = False
-            self.logger.info(f"Buscando título '{title}' en el documento...")
+            if self.document is None:
+                raise ValueError("El documento no ha sido cargado.")
 
-            for para in self.document.paragraphs:
-                text = para.text.strip()
-                style = para.style.name
+            paragraphs = self.document.paragraphs
+            if self.streaming:
+                styles = [record.style for record in paragraphs]
+            else:
+                # Resolver los nombres de estilo una sola vez en lugar de consultar `para.style` por párrafo
+                style_names, default_name = self._style_names()
+                styles = [style_names.get(para._p.style, default_name) for para in paragraphs]
+
+            headings = []  # (texto, posición del párrafo)
+
+            for position, (para, style) in enumerate(zip(paragraphs, styles)):
+                if style.startswith("ARTICA"):
+                    text = para.text.strip()
+                    headings.append((text, position))
+
+            self._section_index = {
+                "paragraphs": paragraphs,
+                "headings": headings,
+                "titles": {},  # título buscado -> índice en `headings` (o None)
+                "content": {},  # índice en `headings` -> contenido capturado
+            }
+            contar("parrafos_leidos", len(paragraphs))
+            self.logger.info(f"Índice de secciones construido: {len(headings)} títulos en {len(paragraphs)} párrafos.")
+            return self._section_index
+        except Exception as e:
+            self.logger.exception(f"Error al construir el índice de secciones: {e}")
+            raise
+
+
+    def _locate_heading(self, title):
+        """Devuelve la posición en el índice del primer título ARTICA que corresponde a `title`."""
+        index = self._section_index
+        if title in index["titles"]:
+            return index["titles"][title]
+
+        # Primer título que contenga el texto buscado, como al recorrer el documento en orden: una
+        # coincidencia exacta posterior no tiene preferencia. Solo se recorren los títulos, no los párrafos.
+        position = next(
+            (i for i, (text, _) in enumerate(index["headings"]) if title in text),
+            None,
+        )
+
+        index["titles"][title] = position
+        return position
+
+
+    def _extract_paragraph(self, para):
+        """Extrae el texto con formato y las imágenes de un párrafo."""
+        if self.streaming:
+            return self._extract_record(para)
+
+        content = []
+        runs = para.runs
 
-                # Iniciar captura si encontramos el título con el estilo adecuado
-                if title in text and style.startswith("ARTICA") and not capturing:
-                    capturing = True
-                    self.logger.info(f"Título encontrado: '{text}' con estilo {style}")
-                    content.append({"type": "text", "content": [{"text": text}]})
+        # Capturar texto con formato (los runs contiguos con el mismo formato se fusionan)
+        if runs:
+            content.append(TextBlock((run.text, run.bold, run.italic, run.underline) for run in runs))
+
+        # Detectar imágenes en el párrafo
+        for run in runs:
+            if run._element.xpath(".//w:drawing"):
+                image = self._image_block(run)
+                if image is None:
+                    self.logger.warning("No se encontraron datos de imagen en el `Run`.")
                     continue
+                self.logger.debug("Imagen encontrada.")
+                content.append(image)
 
-                # Detener la captura si encontramos otro título con estilo de título
-                if capturing:
-                    if style.startswith("ARTICA") and title not in text:
-                        self.logger.info(f"Fin de la sección para el título '{title}' detectado.")
-                        break
-
-                    # Capturar texto con formato
-                    paragraph_content = []
-                    for run in para.runs:
-                        paragraph_content.append({
-                            "text": run.text,
-                            "bold": run.bold,
-                            "italic": run.italic,
-                            "underline": run.underline,
-                        })
-
-                    if paragraph_content:
-                        content.append({"type": "text", "content": paragraph_content})
-
-                    # Detectar imágenes en el párrafo
-                    for run in para.runs:
-                        if run._element.xpath(".//w:drawing"):
-                            self.logger.info("Imagen encontrada.")
-                            content.append({"type": "image", "content": run})  # Guardar el `Run` de la imagen
-
-
-            if capturing:
-                self.logger.info(f"Contenido capturado para '{title}': {content[:2]}...")
-            else:
+        return content
+
+
+    def _image_block(self, run):
+        """Copia los bytes de la imagen de un `Run` en un `ImageBlock`, sin conservar referencias al documento."""
+        blip_elements = run._element.xpath(".//a:blip")
+        if not blip_elements:
+            return None
+
+        part = run.part.related_parts[blip_elements[0].get(qn("r:embed"))]
+        extent = run._element.xpath(".//wp:extent")
+        extent = (int(extent[0].get("cx")), int(extent[0].get("cy"))) if extent else None
+        return self._image_from_part(part, extent)
+
+
+    def _image_from_part(self, part, extent=None):
+        """`ImageBlock` con los bytes de una parte de imagen; el hash se calcula una vez por parte."""
+        digest = self._image_digests.get(part.partname)
+        if digest is None:
+            digest = hashlib.sha1(part.blob).hexdigest()
+            self._image_digests[part.partname] = digest
+        return ImageBlock(digest, part.blob, extent)
+
+
+    def _extract_record(self, record):
+        """Equivalente a `_extract_paragraph` para los registros del lector en streaming."""
+        content = []
+        if record.runs:
+            content.append(TextBlock(record.runs))
+
+        for rId, extent in record.images:
+            ref = self.document.image_ref(rId) if rId else None
+            if ref is None:
+                self.logger.warning("No se encontraron datos de imagen en el párrafo.")
+                continue
+            self.logger.debug("Imagen encontrada.")
+
+            # Solo se guarda la referencia al zip: los bytes se vuelven a leer al exportar
+            digest = self._image_digests.get(ref.member)
+            if digest is None:
+                digest = hashlib.sha1(ref.read()).hexdigest()
+                self._image_digests[ref.member] = digest
+            content.append(ImageBlock(digest, ref, extent))
+
+        return content
+
+
+    @cronometrar("procesar.find_section_content")
+    def find_section_content(self, title):
+        """Busca el contenido de una sección basándose en su título y estilo."""
+        try:
+            if self._section_index is None:
+                self.build_section_index()
+
+            self.logger.debug("Buscando título '%s' en el documento...", title)
+            index = self._section_index
+            position = self._locate_heading(title)
+
+            if position is None:
                 self.logger.warning(f"No se pudo capturar contenido para '{title}'.")
+                return []
+
+            if position in index["content"]:
+                return index["content"][position]
+
+            headings = index["headings"]
+            paragraphs = index["paragraphs"]
+            text, start = headings[position]
+            self.logger.debug("Título encontrado: '%s' en el párrafo %d", text, start)
 
+            # La sección termina en el siguiente título ARTICA que no contenga el título buscado
+            end = len(paragraphs)
+            for next_text, next_start in headings[position + 1:]:
+                if title not in next_text:
+                    end = next_start
+                    self.logger.debug("Fin de la sección para el título '%s' detectado.", title)
+                    break
+
+            content = Section([heading_block(text)])
+            for para in paragraphs[start + 1:end]:
+                content.extend(self._extract_paragraph(para))
+
+            if not self.streaming:
+                # Copia de los párrafos y tablas del cuerpo entre ambos títulos, para insertarlos en bloque
+                stop = paragraphs[end]._p if end < len(paragraphs) else None
+                content.xml = capture_section_xml(self.document, body_elements(paragraphs[start]._p, stop), self._image_from_part)
+
+            index["content"][position] = content
+            self.logger.debug("Contenido capturado para '%s': %d elementos.", title, len(content))
             return content
         except Exception as e:
             self.logger.exception(f"Error al buscar contenido para '{title}': {e}")
             return []
 
 
-    def identify_sections(self, keywords):
+    @cronometrar("procesar.identify_sections")
+    def identify_sections(self, keywords, matcher=None):
         """Identifica las secciones basadas en el índice y recupera el contenido correspondiente."""
         try:
             if self.document is None:
                 raise ValueError("El documento no ha sido cargado.")
 
             # Extraer títulos del índice
-            index_titles = self.extract_index_titles(keywords)
+            index_titles = self.extract_index_titles(keywords, matcher)
             if not index_titles:
                 self.logger.warning("No se encontraron títulos en el índice con las palabras clave.")
                 return
 
             self.logger.info("Buscando contenido correspondiente a los títulos detectados...")
+            self.build_section_index()
             for title, page in index_titles:
                 content = self.find_section_content(title)
                 if content:
                     self.sections[title] = content
-                    self.logger.info(f"Sección encontrada: {title}")
+                    self.section_pages[title] = page
+                    self.logger.info("Sección encontrada: %s", title)
                 else:
-                    self.logger.warning(f"No se encontró contenido para el título: {title}")
+                    self.logger.warning("No se encontró contenido para el título: %s", title)
 
+            contar("secciones_encontradas", len(self.sections))
             self.logger.info(f"Secciones identificadas: {len(self.sections)}")
         except Exception as e:
             self.logger.exception(f"Error al identificar secciones: {e}")
 
 
+    def release_document(self):
+        """
+        Libera el documento de origen y el índice de secciones. Las secciones ya identificadas no
+        guardan referencias a él, así que pueden seguir exportándose.
+        """
+        self.document = None
+        self._section_index = None
+        self._image_digests = {}
+
+
     def get_sections(self):
         """Devuelve las secciones identificadas para revisión o exportación."""
         try:
@@ -0,0 +1,123 @@
+import zipfile
+import hashlib
+from collections import namedtuple
+from lxml import etree
+from docx.oxml.parser import parse_xml
+
+# Tramo de texto con el mismo formato (negrita, cursiva y subrayado tri-estado, como en python-docx)
+TextRun = namedtuple("TextRun", "text bold italic underline")
+
+
+class ImageRef(namedtuple("ImageRef", "file_path member")):
+    """Referencia diferida a una imagen dentro del .docx de origen: los bytes se leen solo al exportar."""
+    __slots__ = ()
+
+    def read(self):
+        with zipfile.ZipFile(self.file_path) as archive:
+            return archive.read(self.member)
+
+
+def coalesce_runs(runs):
+    """Fusiona los tramos contiguos con el mismo formato; Word suele partir un texto uniforme en muchos runs."""
+    merged = []
+    for text, bold, italic, underline in runs:
+        if merged and merged[-1][1:] == (bold, italic, underline):
+            merged[-1] = TextRun(merged[-1].text + text, bold, italic, underline)
+        else:
+            merged.append(TextRun(text, bold, italic, underline))
+    return tuple(merged)
+
+
+class TextBlock:
+    """Párrafo de texto de una sección: tupla de `TextRun` ya fusionados."""
+    __slots__ = ("runs",)
+    type = "text"
+
+    def __init__(self, runs):
+        self.runs = coalesce_runs(runs)
+
+    @property
+    def text(self):
+        return "".join(run.text for run in self.runs)
+
+    def __repr__(self):
+        return f"TextBlock({self.text!r})"
+
+
+class ImageBlock:
+    """
+    Imagen de una sección: hash del contenido, bytes (o una `ImageRef` para leerlos más tarde) y
+    extensión original (cx, cy) en EMU. No guarda referencias al documento de origen.
+    """
+    __slots__ = ("digest", "source", "extent")
+    type = "image"
+
+    def __init__(self, digest, source, extent=None):
+        self.digest = digest
+        self.source = source
+        self.extent = extent
+
+    @classmethod
+    def from_bytes(cls, data, extent=None):
+        return cls(hashlib.sha1(data).hexdigest(), data, extent)
+
+    @property
+    def data(self):
+        """Bytes de la imagen."""
+        return self.source if isinstance(self.source, bytes) else self.source.read()
+
+    def __repr__(self):
+        return f"ImageBlock({self.digest[:12]}, {self.extent})"
+
+
+def heading_block(text):
+    """Bloque con el título de la sección, sin negrita, cursiva ni subrayado."""
+    return TextBlock([(text, False, False, False)])
+
+
+class SectionXml:
+    """
+    Copia independiente de los elementos del cuerpo (`w:p`, `w:tbl`) de una sección, con lo
+    necesario para insertarlos en otro documento: imágenes por r:id de origen, enlaces externos,
+    definiciones de estilo y de numeración que usan.
+    """
+    __slots__ = ("elements", "images", "links", "styles", "numbering")
+
+    def __init__(self, elements, images, links, styles, numbering):
+        self.elements = elements  # tupla de elementos lxml ya copiados
+        self.images = images  # r:id de origen -> ImageBlock
+        self.links = links  # r:id de origen -> (tipo de relación, destino) de las relaciones externas
+        self.styles = styles  # styleId -> copia de w:style
+        self.numbering = numbering  # numId de origen -> (copia de w:num, copia de w:abstractNum o None)
+
+    # Los elementos lxml no se pueden serializar con pickle: entre procesos viajan como XML
+    def __getstate__(self):
+        return {
+            "elements": [etree.tostring(element) for element in self.elements],
+            "images": self.images,
+            "links": self.links,
+            "styles": {style_id: etree.tostring(style) for style_id, style in self.styles.items()},
+            "numbering": {
+                num_id: (etree.tostring(num), etree.tostring(abstract) if abstract is not None else None)
+                for num_id, (num, abstract) in self.numbering.items()
+            },
+        }
+
+    def __setstate__(self, state):
+        self.elements = tuple(parse_xml(xml) for xml in state["elements"])
+        self.images = state["images"]
+        self.links = state["links"]
+        self.styles = {style_id: parse_xml(xml) for style_id, xml in state["styles"].items()}
+        self.numbering = {
+            num_id: (parse_xml(num), parse_xml(abstract) if abstract is not None else None)
+            for num_id, (num, abstract) in state["numbering"].items()
+        }
+
+
+class Section(list):
+    """Contenido de una sección: lista de bloques y, si se leyó con python-docx, su XML en `xml`."""
+    __slots__ = ("xml",)
+
+    def __init__(self, blocks=(), xml=None):
+        super().__init__(blocks)
+        self.xml = xml
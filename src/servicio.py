@@ -0,0 +1,295 @@
+import os
+import glob
+import json
+import time
+import uuid
+import queue
+import shutil
+import signal
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from logging_config import fusionar_logs
+from mapeo import cargar_mapeo
+from plantillas import precargar_plantillas
+from manifiesto import leer_proyecto_menor
+from indice import load_keywords
+from lote import procesar_documento, exportar_en_worker, completar_documento, resultado_error, inicializar_worker
+
+logger = logging.getLogger(__name__)
+
+MAX_TRABAJOS_GUARDADOS = 1000  # Trabajos terminados que se pueden seguir consultando
+ESTADOS_FINALES = ("ok", "error")
+
+
+class ServicioSaturado(Exception):
+    """No se admiten más solicitudes hasta que terminen algunas de las pendientes."""
+
+
+class SolicitudService:
+    """
+    Servicio residente: mantiene en memoria las keywords, el mapeo y los índices de las plantillas
+    y procesa las solicitudes que recibe como trabajos.
+
+    Como en `procesar_lote`, la identificación y exportación se reparten en un pool de procesos
+    persistente y la inserción en plantillas se hace en un único hilo, en orden de llegada.
+    Como mucho hay `max_pendientes` trabajos admitidos sin terminar; por encima se rechazan.
+    """
+
+    def __init__(self, input_dir, output_dir, map_file_path, keywords_file_path, workers=1, max_pendientes=16,
+                 export_sections=True, streaming=False, log_file_path=None):
+        self.logger = logging.getLogger(__name__)
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.map_file_path = map_file_path
+        self.keywords_file_path = keywords_file_path
+        self.workers = workers
+        self.export_sections = export_sections
+        self.streaming = streaming
+        self.log_file_path = log_file_path
+        self.staging_root = os.path.join(output_dir, ".servicio")
+
+        self._keywords = None
+        self._keywords_firma = None
+        self._trabajos = OrderedDict()  # id -> trabajo
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self.max_pendientes = max_pendientes
+        self._cola = queue.Queue()  # (trabajo, futuro) en orden de llegada, para el hilo de inserción
+        self._pool = None
+        self._hilo = None
+
+
+    def keywords(self):
+        """Keywords en memoria; se vuelven a leer solo si cambia el archivo."""
+        stat = os.stat(self.keywords_file_path)
+        firma = (stat.st_mtime_ns, stat.st_size)
+        if firma != self._keywords_firma:
+            self._keywords = load_keywords(self.keywords_file_path)
+            self._keywords_firma = firma
+        return self._keywords
+
+
+    def start(self):
+        """Precarga keywords, mapeo y plantillas, arranca el pool de procesos y el hilo de inserción."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not self.keywords():
+            raise ValueError("No se pudieron cargar las keywords.")
+        cargar_mapeo(self.map_file_path)
+        precargar_plantillas("config", documentos=True)
+
+        if self.workers > 1:
+            os.makedirs(self.staging_root, exist_ok=True)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=inicializar_worker,
+                                             initargs=(self.log_file_path,))
+        self._hilo = threading.Thread(target=self._insertar_en_orden, name="insercion", daemon=True)
+        self._hilo.start()
+        self.logger.info("Servicio iniciado con %d procesos y hasta %d solicitudes pendientes.", self.workers, self.max_pendientes)
+
+
+    def stop(self):
+        """Deja de aceptar trabajos, termina los admitidos y libera el pool."""
+        if self._hilo is not None:
+            self._cola.put(None)
+            self._hilo.join()
+            self._hilo = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        shutil.rmtree(self.staging_root, ignore_errors=True)
+        if self.log_file_path:
+            base, _ = os.path.splitext(self.log_file_path)
+            fusionar_logs(self.log_file_path, glob.glob(f"{glob.escape(base)}_worker*.log"))
+
+
+    def _resolver_archivo(self, archivo):
+        """Ruta del documento pedido: absoluta o relativa a INPUT_FOLDER pero siempre dentro de ella, y solo .docx."""
+        if not archivo or not isinstance(archivo, str):
+            raise ValueError("Falta el campo 'archivo'.")
+        base = os.path.realpath(self.input_dir)
+        ruta = os.path.realpath(os.path.join(base, archivo))
+        if os.path.commonpath([base, ruta]) != base:
+            raise ValueError(f"El archivo debe estar dentro de INPUT_FOLDER: {archivo}")
+        if not ruta.lower().endswith(".docx") or os.path.basename(ruta).startswith("~$"):
+            raise ValueError(f"Solo se admiten documentos .docx: {archivo}")
+        if not os.path.isfile(ruta):
+            raise ValueError(f"No existe el archivo: {ruta}")
+        return ruta
+
+
+    def submit(self, archivo, proyecto_menor=False):
+        """Admite una solicitud y devuelve su trabajo; lanza `ServicioSaturado` si no quedan cupos."""
+        file_path = self._resolver_archivo(archivo)
+        if not self._cupos.acquire(blocking=False):
+            raise ServicioSaturado(f"Hay {self.max_pendientes} solicitudes pendientes; inténtelo más tarde.")
+
+        trabajo = {
+            "id": uuid.uuid4().hex,
+            "archivo": file_path,
+            "proyecto_menor": bool(proyecto_menor),
+            "estado": "pendiente",
+            "recibido": time.time(),
+            "resultado": None,
+            "terminado": threading.Event(),
+        }
+        with self._lock:
+            self._trabajos[trabajo["id"]] = trabajo
+
+        futuro = None
+        try:
+            if self._pool is not None:
+                staging_dir = os.path.join(self.staging_root, trabajo["id"])
+                os.makedirs(staging_dir, exist_ok=True)
+                trabajo["staging_dir"] = staging_dir
+                futuro = self._pool.submit(exportar_en_worker, file_path, self.keywords(), staging_dir, self.streaming,
+                                           self.export_sections)
+        except Exception as e:
+            self.logger.exception(f"Error al encolar la solicitud {trabajo['id']}: {e}")
+            self._terminar(trabajo, resultado_error(file_path, e))
+            return trabajo
+        self._cola.put((trabajo, futuro))
+        self.logger.info("Solicitud admitida %s: %s", trabajo["id"], file_path)
+        return trabajo
+
+
+    def _insertar_en_orden(self):
+        """Hilo de inserción: completa los trabajos en orden de llegada."""
+        while True:
+            elemento = self._cola.get()
+            if elemento is None:
+                return
+            trabajo, futuro = elemento
+            trabajo["estado"] = "en_curso"
+            inicio = time.time()
+            try:
+                if futuro is None:
+                    resultado = procesar_documento(trabajo["archivo"], self.keywords(), self.output_dir, self.map_file_path,
+                                                   trabajo["proyecto_menor"], self.export_sections, self.streaming)
+                else:
+                    try:
+                        resultado, sections = futuro.result()
+                    except Exception as e:
+                        self.logger.exception(f"Error en el proceso worker: {e}")
+                        resultado, sections = resultado_error(trabajo["archivo"], e), {}
+                    completar_documento(resultado, sections, trabajo["staging_dir"], self.output_dir, self.map_file_path,
+                                        trabajo["proyecto_menor"], self.export_sections)
+            except Exception as e:
+                self.logger.exception(f"Error al procesar la solicitud {trabajo['id']}: {e}")
+                resultado = resultado_error(trabajo["archivo"], e)
+
+            resultado["tiempo_espera"] = round(inicio - trabajo["recibido"], 3)
+            resultado["tiempo_total"] = round(time.time() - trabajo["recibido"], 3)
+            self.logger.info("Solicitud %s terminada (%s): %d secciones en %.2fs, %.2fs en cola.", trabajo["id"],
+                             resultado["estado"], resultado["secciones"], resultado["tiempo_total"], resultado["tiempo_espera"])
+            self._terminar(trabajo, resultado)
+
+
+    def _terminar(self, trabajo, resultado):
+        trabajo["resultado"] = resultado
+        trabajo["estado"] = resultado["estado"]
+        trabajo["terminado"].set()
+        self._cupos.release()
+
+        # Olvidar los trabajos terminados más antiguos
+        with self._lock:
+            terminados = [i for i, t in self._trabajos.items() if t["estado"] in ESTADOS_FINALES]
+            for trabajo_id in terminados[:max(0, len(terminados) - MAX_TRABAJOS_GUARDADOS)]:
+                del self._trabajos[trabajo_id]
+
+
+    def get(self, trabajo_id):
+        with self._lock:
+            return self._trabajos.get(trabajo_id)
+
+
+    def estado(self):
+        with self._lock:
+            pendientes = sum(1 for t in self._trabajos.values() if t["estado"] not in ESTADOS_FINALES)
+        return {"estado": "ok", "pendientes": pendientes, "max_pendientes": self.max_pendientes, "workers": self.workers}
+
+
+def describir_trabajo(trabajo):
+    """Representación JSON de un trabajo."""
+    descripcion = {"id": trabajo["id"], "archivo": trabajo["archivo"], "estado": trabajo["estado"]}
+    if trabajo["resultado"] is not None:
+        descripcion.update(trabajo["resultado"])
+        descripcion["estado"] = trabajo["estado"]
+    return descripcion
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    API HTTP del servicio:
+        POST /solicitudes        {"archivo": "...", "proyecto_menor": false, "esperar": false}
+        GET  /solicitudes/<id>   estado, salidas, tiempos y métricas del trabajo
+        GET  /salud              trabajos pendientes
+    """
+    servicio = None  # Se asigna en `crear_servidor`
+
+    def _responder(self, codigo, cuerpo, cabeceras=None):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/salud":
+            return self._responder(200, self.servicio.estado())
+        if self.path.startswith("/solicitudes/"):
+            trabajo = self.servicio.get(self.path[len("/solicitudes/"):])
+            if trabajo is None:
+                return self._responder(404, {"error": "Solicitud no encontrada."})
+            return self._responder(200, describir_trabajo(trabajo))
+        self._responder(404, {"error": "Ruta no encontrada."})
+
+    def do_POST(self):
+        if self.path != "/solicitudes":
+            return self._responder(404, {"error": "Ruta no encontrada."})
+        try:
+            longitud = int(self.headers.get("Content-Length") or 0)
+            peticion = json.loads(self.rfile.read(longitud) or b"{}")
+            if not isinstance(peticion, dict):
+                raise ValueError("El cuerpo debe ser un objeto JSON.")
+            proyecto_menor = leer_proyecto_menor(peticion.get("proyecto_menor", False))
+            trabajo = self.servicio.submit(peticion.get("archivo"), proyecto_menor)
+        except ServicioSaturado as e:
+            return self._responder(503, {"error": str(e)}, {"Retry-After": "5"})
+        except ValueError as e:
+            return self._responder(400, {"error": str(e)})
+
+        if peticion.get("esperar"):
+            trabajo["terminado"].wait()
+            return self._responder(200, describir_trabajo(trabajo))
+        self._responder(202, describir_trabajo(trabajo), {"Location": f"/solicitudes/{trabajo['id']}"})
+
+    def log_message(self, format, *args):
+        logger.debug("%s - " + format, self.address_string(), *args)
+
+
+def crear_servidor(servicio, host, port):
+    handler = type("Handler", (_Handler,), {"servicio": servicio})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def ejecutar_servicio(servicio, host="0.0.0.0", port=5000):
+    """Arranca el servicio y atiende peticiones HTTP hasta recibir SIGTERM o Ctrl+C."""
+    servicio.start()
+    servidor = crear_servidor(servicio, host, port)
+
+    # `shutdown` espera al bucle de `serve_forever`, así que se llama desde otro hilo
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=servidor.shutdown).start())
+    logger.info("Escuchando en http://%s:%d", host, port)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servicio.stop()
+        logger.info("Servicio detenido.")
@@ -0,0 +1,219 @@
+import os
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Eventos de inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def es_documento_entrada(nombre):
+    """True para los .docx reales: descarta otros archivos, ocultos y los bloqueos temporales de Word (~$)."""
+    return nombre.lower().endswith(".docx") and not nombre.startswith(("~$", "."))
+
+
+def _firma(ruta):
+    """(mtime_ns, tamaño) de un archivo o None si ya no existe."""
+    try:
+        stat = os.stat(ruta)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _Inotify:
+    """Acceso mínimo a inotify mediante ctypes; lanza OSError si el sistema no lo ofrece."""
+
+    def __init__(self, carpeta):
+        import ctypes
+        import ctypes.util
+
+        nombre = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(nombre or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify no disponible")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mascara = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self.fd, os.fsencode(carpeta), mascara) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch {carpeta}")
+
+    def leer(self, timeout, despertar=None):
+        """
+        Espera hasta `timeout` segundos y devuelve los nombres con eventos (None si la cola de eventos
+        desbordó). La espera termina antes si hay datos en el descriptor `despertar`.
+        """
+        descriptores = [self.fd] if despertar is None else [self.fd, despertar]
+        listos, _, _ = select.select(descriptores, [], [], timeout)
+        if self.fd not in listos:
+            return set()
+
+        nombres = set()
+        try:
+            datos = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return nombres
+        posicion = 0
+        while posicion + _EVENT_HEADER.size <= len(datos):
+            _, mascara, _, longitud = _EVENT_HEADER.unpack_from(datos, posicion)
+            posicion += _EVENT_HEADER.size
+            nombre = datos[posicion:posicion + longitud].rstrip(b"\0")
+            posicion += longitud
+            if mascara & IN_Q_OVERFLOW:
+                return None
+            if nombre:
+                nombres.add(os.fsdecode(nombre))
+        return nombres
+
+    def close(self):
+        os.close(self.fd)
+
+
+class CarpetaVigilada:
+    """
+    Vigila una carpeta de entrada y entrega lotes de .docx nuevos o modificados.
+
+    Usa inotify en Linux y, si no está disponible, compara la carpeta cada `intervalo` segundos.
+    Un archivo se entrega cuando lleva `espera` segundos sin cambiar de fecha ni de tamaño y ya
+    es un zip válido, de modo que no se leen documentos a medio copiar.
+    """
+
+    def __init__(self, carpeta, espera=2.0, intervalo=5.0, usar_inotify=True):
+        self.carpeta = carpeta
+        self.espera = espera
+        self.intervalo = intervalo
+        self.usar_inotify = usar_inotify
+        self._conocidos = {}  # nombre -> firma ya entregada
+        self._pendientes = {}  # nombre -> (firma, instante en que se vio esa firma por primera vez)
+        self._detener = threading.Event()
+        self._despertar = None  # (lectura, escritura) de la tubería que interrumpe la espera de inotify
+
+
+    def detener(self):
+        """Pide que termine `lotes`; se puede llamar desde un manejador de señal."""
+        self._detener.set()
+        despertar = self._despertar
+        if despertar is not None:
+            try:
+                os.write(despertar[1], b"\0")
+            except OSError:
+                pass  # Tubería llena (ya hay un aviso pendiente) o cerrada (el bucle ya terminó)
+
+
+    def _escanear(self):
+        """Nombres de la carpeta cuya firma difiere de la ya entregada."""
+        with os.scandir(self.carpeta) as entradas:
+            nombres = [entrada.name for entrada in entradas if entrada.is_file() and es_documento_entrada(entrada.name)]
+        return {nombre for nombre in nombres if _firma(os.path.join(self.carpeta, nombre)) != self._conocidos.get(nombre)}
+
+
+    def _anotar(self, nombres, ahora):
+        """Registra cambios: el plazo de espera de un archivo se reinicia cada vez que cambia su firma."""
+        for nombre in nombres:
+            if not es_documento_entrada(nombre):
+                continue
+            firma = _firma(os.path.join(self.carpeta, nombre))
+            if firma is None:
+                self._pendientes.pop(nombre, None)
+            elif nombre not in self._pendientes or self._pendientes[nombre][0] != firma:
+                self._pendientes[nombre] = (firma, ahora)
+
+
+    def _listos(self, ahora):
+        """Saca de pendientes los archivos estables y devuelve sus rutas."""
+        listos = []
+        for nombre, (firma, desde) in list(self._pendientes.items()):
+            ruta = os.path.join(self.carpeta, nombre)
+            actual = _firma(ruta)
+            if actual is None:
+                del self._pendientes[nombre]
+            elif actual != firma:
+                self._pendientes[nombre] = (actual, ahora)
+            elif ahora - desde >= self.espera:
+                del self._pendientes[nombre]
+                if actual == self._conocidos.get(nombre):
+                    continue
+                if not zipfile.is_zipfile(ruta):
+                    # Todavía incompleto (o no es un .docx válido): se vuelve a mirar tras otra espera
+                    self._pendientes[nombre] = (actual, ahora)
+                    continue
+                self._conocidos[nombre] = actual
+                listos.append(ruta)
+        return sorted(listos)
+
+
+    def lotes(self, incluir_existentes=True):
+        """
+        Generador de listas de rutas listas para procesar. Con `incluir_existentes` el primer lote
+        incluye los documentos que ya estaban en la carpeta; si no, solo se entregan los que lleguen después.
+        """
+        inotify = None
+        if self.usar_inotify:
+            try:
+                inotify = _Inotify(self.carpeta)
+                logger.info("Vigilando %s con inotify.", self.carpeta)
+            except (OSError, AttributeError) as e:
+                logger.info("inotify no disponible (%s); se comprobará la carpeta cada %.1fs.", e, self.intervalo)
+        if inotify is None:
+            logger.info("Vigilando %s por sondeo.", self.carpeta)
+        else:
+            # `detener` escribe en la tubería para que `select` no espere al final del plazo
+            self._despertar = os.pipe()
+            for fd in self._despertar:
+                os.set_blocking(fd, False)
+
+        existentes = self._escanear()
+        if incluir_existentes:
+            self._anotar(existentes, time.monotonic() - self.espera)
+        else:
+            for nombre in existentes:
+                self._conocidos[nombre] = _firma(os.path.join(self.carpeta, nombre))
+
+        ultimo_escaneo = time.monotonic()
+        try:
+            while not self._detener.is_set():
+                ahora = time.monotonic()
+                listos = self._listos(ahora)
+                if listos:
+                    yield listos
+                    continue
+
+                # Esperar a eventos, al siguiente archivo que cumpla su espera o al siguiente sondeo
+                timeout = self.intervalo
+                if self._pendientes:
+                    timeout = min(timeout, max(0.05, min(desde for _, desde in self._pendientes.values()) + self.espera - ahora))
+
+                if inotify is not None:
+                    nombres = inotify.leer(timeout, self._despertar[0])
+                    if nombres is None:
+                        nombres = self._escanear()  # Se perdieron eventos: comparar la carpeta entera
+                else:
+                    self._detener.wait(timeout)
+                    nombres = set()
+                    if time.monotonic() - ultimo_escaneo >= self.intervalo:
+                        nombres = self._escanear()
+                        ultimo_escaneo = time.monotonic()
+                self._anotar(nombres, time.monotonic())
+        finally:
+            if inotify is not None:
+                inotify.close()
+                despertar, self._despertar = self._despertar, None
+                for fd in despertar:
+                    os.close(fd)